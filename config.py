@@ -10,6 +10,7 @@ import clipboard
 import utils
 from getters.getterFactory import GetterFactory
 from reader.entry import Entry
+from search.searcher_factory import available_searchers
 from visual.instantiator import available_uis
 
 
@@ -22,13 +23,27 @@ class Config:
             self.conf_dict = conf_dict
         self.user_setting_keys = ["bibtex_getter", "bibtex_getter_params", "pdf_getter", "pdf_getter_params", 
                                 "pdf_dir", "ui", "tmp_dir", "bib_path", "view_columns", "sort_column",
-                                "search_result_size", "list_result_size", "searcher", "editor"]
+                                "search_result_size", "list_result_size", "searcher", "editor", "read_mode", "write_mode",
+                                "bibtex_getters", "bibtex_getter_timeouts", "response_cache_size", "response_cache_ttl",
+                                "prefetch_size", "autocomplete_similarity", "download_workers", "search_prefilter_overlap"]
+        self.read_modes = ["default", "stream", "parallel"]
+        self.write_modes = ["full", "incremental"]
         self.modified = False
 
     def get_searcher(self):
         s =  self.get_user_setting('searcher')
         if s is None:
             return "fuzzy"
+        return s
+
+    def get_search_prefilter_overlap(self):
+        return self.get_user_setting("search_prefilter_overlap", default=0)
+
+    def get_read_mode(self):
+        return self.get_user_setting("read_mode", default="default") or "default"
+
+    def get_write_mode(self):
+        return self.get_user_setting("write_mode", default="full") or "full"
 
     def get_visual(self):
         try:
@@ -43,13 +58,13 @@ class Config:
         return self.conf_dict["controls"]
 
     def get_pdf_apis(self):
-        self.get()["pdf_apis"]
+        return self.get().get("pdf_apis")
 
     def get_bibtex_apis(self):
-        self.get()["bibtex_apis"]
+        return self.get().get("bibtex_apis")
 
     def get_num_retrieved_bibtex(self):
-        self.get()["num_retrieved_bibtex"]
+        return self.get().get("num_retrieved_bibtex")
 
     def get_view_columns(self):
         cols = self.get_user_setting('view_columns')
@@ -151,6 +166,12 @@ class Config:
             if value not in avail:
                 valid = False
                 msg = f"No getters named {value}. Available ones are {avail}"
+        elif key == "bibtex_getters":
+            avail = GetterFactory.get_names()
+            invalids = [v for v in value if v not in avail]
+            if invalids:
+                valid = False
+                msg = f"No getters named {invalids}. Available ones are {avail}"
         elif key == "view_columns":
             if type(value) == str:
                 value = value.split()
@@ -162,6 +183,38 @@ class Config:
             if value not in Entry.useful_keys:
                 valid = False
                 msg = f"Invalid sort column set: {value}. Available ones are {Entry.useful_keys}"
+        elif key in ["response_cache_size", "response_cache_ttl"]:
+            try:
+                value = int(value)
+                if value < 0:
+                    raise ValueError
+            except ValueError:
+                msg = f"Response cache size / ttl has to be a non-negative integer"
+                valid = False
+        elif key in ["prefetch_size", "download_workers"]:
+            try:
+                value = int(value)
+                if value <= 0:
+                    raise ValueError
+            except ValueError:
+                msg = f"Prefetch size / download workers has to be a positive integer"
+                valid = False
+        elif key == "autocomplete_similarity":
+            try:
+                value = int(value)
+                if not 0 <= value <= 100:
+                    raise ValueError
+            except ValueError:
+                msg = f"Autocomplete similarity has to be an integer in [0, 100]"
+                valid = False
+        elif key == "search_prefilter_overlap":
+            try:
+                value = float(value)
+                if not 0 <= value <= 1:
+                    raise ValueError
+            except ValueError:
+                msg = f"Search prefilter overlap has to be a number in [0, 1]"
+                valid = False
         elif key in ["search_result_size", "list_result_size"]:
             try:
                 value = int(value)
@@ -174,6 +227,18 @@ class Config:
             if value not in available_uis:
                 msg = f"Ui {value} is undefined. Available ones are {available_uis}"
                 valid = False
+        elif key == "searcher":
+            if value not in available_searchers:
+                msg = f"Searcher {value} is undefined. Available ones are {available_searchers}"
+                valid = False
+        elif key == "read_mode":
+            if value not in self.read_modes:
+                msg = f"Read mode {value} is undefined. Available ones are {self.read_modes}"
+                valid = False
+        elif key == "write_mode":
+            if value not in self.write_modes:
+                msg = f"Write mode {value} is undefined. Available ones are {self.write_modes}"
+                valid = False
         else:
             # un validate-able setting
             pass
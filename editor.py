@@ -1,12 +1,21 @@
+import os
 import re
 import string
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from os import listdir, remove, rename, system
 from os.path import basename, dirname, exists, isabs, isdir, join, splitext, expanduser
 
+from fuzzywuzzy import fuzz, process
+
 import utils
 from decorators import ignore_arg
 from getters.getter import Getter
+from getters.multi_getter import normalize_title, result_field
+from pdf_index import PdfIndex
+from pdf_scan import PdfScan
 from visual.instantiator import setup
 
 
@@ -81,21 +90,56 @@ class Editor:
                     return
         self.visual.message("Update complete.")
 
+    def get_pdf_scan(self):
+        return PdfScan(self.pdf_dir, join(self.config.get_config_file_dir(), "cache", "pdf_scan.json"), self.visual)
+
+    def get_pdf_index(self):
+        return PdfIndex(self.pdf_dir, join(self.config.get_config_file_dir(), "cache"), self.visual)
+
+    def match_pdfs_by_content(self, entry_collection, pdf_index, paths):
+        """Match pdfs to entries by the DOI or normalized title in their contents, returning a path to entry id mapping"""
+        doi2id = {x.doi.lower(): ID for (ID, x) in entry_collection.entries.items() if x.doi}
+        ntitle2id = {normalize_title(x.title): ID for (ID, x) in entry_collection.entries.items() if x.title}
+        matches = {}
+        for path in paths:
+            info = pdf_index.get_info(basename(path))
+            if info is None:
+                continue
+            if info["doi"] in doi2id:
+                matches[path] = doi2id[info["doi"]]
+            elif info["title"] and normalize_title(info["title"]) in ntitle2id:
+                matches[path] = ntitle2id[normalize_title(info["title"])]
+        return matches
+
+    def resolve_pdf_path(self, file_path):
+        """Get the full path of an entry file, which may be relative to the pdf directory"""
+        return file_path if isabs(file_path) else join(self.pdf_dir, file_path)
+
     def check_pdf_naming_consistency(self, entry_collection):
-        # check for missing pdfs
-        missing_pdfs = [x for x in entry_collection.entries.values() if x.has_file() and not exists(x.file)]
-        self.visual.error("Missing pdfs for {} entries".format(len(missing_pdfs)))
-        existing_pdfs = [x for x in entry_collection.entries.values() if x not in missing_pdfs]
+        # a single pass over the pdf directory
+        scan = self.get_pdf_scan()
+        scan.scan()
+        pdf_paths = scan.paths()
+        # extract pdf titles / DOIs meanwhile, to match dangling pdfs
+        pdf_index = self.get_pdf_index()
+        pdf_index.start(scan.files)
+        scan_dir = os.path.normpath(self.pdf_dir)
+        entry_paths = {ID: self.resolve_pdf_path(x.file) for (ID, x) in entry_collection.entries.items() if x.has_file()}
+        # check for missing pdfs, statting only files outside the pdf directory
+        missing_ids = {ID for (ID, path) in entry_paths.items()
+                       if path not in pdf_paths and (os.path.normpath(dirname(path)) == scan_dir or not exists(path))}
+        self.visual.error("Missing pdfs for {} entries".format(len(missing_ids)))
+        existing_pdfs = [x for (ID, x) in entry_collection.entries.items() if ID not in missing_ids]
 
         # check for existing pdf names
         self.visual.log("Checking assigned pdf naming consistency.")
-        non_canonics = [x for x in  existing_pdfs if not self.check_entry_canonic_pdf_path(x)]
+        non_canonics = [x for x in  existing_pdfs if not self.check_entry_canonic_pdf_path(x, pdf_paths)]
         for entry in self.visual.print_loop(non_canonics, lambda_item=lambda x: "{}: {}".format(x.ID, x.file)):
             proper_path = join(self.pdf_dir, entry.file)
             entry_dir, entry_file = dirname(entry.file), basename(entry.file)
             if entry.file == proper_path:
                 # set only leaf filename to the entry
-                entry.file = entry.get_canonic_filename()
+                entry.set_file(entry.get_canonic_filename())
                 self.visual.log("Setting leaf-only file entry")
                 entry_collection.set_modified()
             else:
@@ -106,12 +150,14 @@ class Editor:
         # check for unmatched pdfs in the pdf folder
         self.visual.log("Checking for dangling pdfs.")
         unmatched = []
-        for fname in listdir(self.pdf_dir):
-            fpath = join(self.pdf_dir, fname)
-            if not entry_collection.pdf_path_exists(fpath):
+        assigned_paths = set(entry_paths.values())
+        for fpath in sorted(pdf_paths - assigned_paths):
+            fname = basename(fpath)
+            # only pdfs, skipping e.g. partial downloads
+            if fname.lower().endswith(".pdf"):
                 # attempt to assign
-                candidate_id = splitext(fname)[0]
-                if  candidate_id in entry_collection.id_list:
+                candidate_id = splitext(fname)[0].lower()
+                if  candidate_id in entry_collection.entries:
                     self.visual.log("Assigned dangling {} to matching id {}.".format(fname, candidate_id))
                     entry_collection.entries[candidate_id].set_file(fpath)
                     entry_collection.set_modified()
@@ -127,25 +173,36 @@ class Editor:
                 self.visual.message("Deleted.")
             elif utils.matches(sel, "move"):
                 move_dir = self.visual.ask_user("Directory to move pdfs to:")
-                while not (exists(move_dir) and is_dir(move_dir)):
+                while not (exists(move_dir) and isdir(move_dir)):
                     if not move_dir:
                         self.visual.message("Aborting.")
                         return
                     self.visual.message("Not a valid directory: {}".format(move_dir))
-                    for fpath in unmatched:
-                        os.rename(fpath, join(move_dir, basename(fpath)))
-                    self.visual.message("Moved.")
+                    move_dir = self.visual.ask_user("Directory to move pdfs to:")
+                for fpath in unmatched:
+                    os.rename(fpath, join(move_dir, basename(fpath)))
+                self.visual.message("Moved.")
             elif utils.matches(sel, "write-list"):
                 write_file = self.visual.ask_user("Write to what file?")
-                while not (exists(write_file)):
-                    if not write_file:
-                        self.visual.message("Aborting.")
-                        return
-                    self.visual.message("Not a valid file: {}".format(write_file))
-                    with open(write_file, "w") as f:
-                        f.write("\n".join(unmatched))
-                    self.visual.message("Wrote.")
+                if not write_file:
+                    self.visual.message("Aborting.")
+                    return
+                with open(write_file, "w") as f:
+                    f.write("\n".join(unmatched))
+                self.visual.message("Wrote.")
             elif utils.matches(sel, "search-collection"):
+                self.visual.log("Waiting for the pdf contents index.")
+                pdf_index.wait()
+                matches = self.match_pdfs_by_content(entry_collection, pdf_index, unmatched)
+                if matches:
+                    self.visual.message("Matched {} pdfs to entries by DOI / title:".format(len(matches)))
+                    self.visual.print_enum([(path, entry_collection.entries[ID].ID) for (path, ID) in matches.items()], at_most=30, header=["pdf path", "entry"])
+                    if self.visual.yes_no("Assign them?"):
+                        for path, ID in matches.items():
+                            entry_collection.entries[ID].set_file(path)
+                        entry_collection.set_modified()
+                        unmatched = [path for path in unmatched if path not in matches]
+                # fuzzy search for the rest
                 all_titles = entry_collection.title_list
                 all_authors = list(set([auth for ent in entry_collection.entries.values() for auth in ent.author]))
                 for i, upath in enumerate(unmatched):
@@ -153,14 +210,14 @@ class Editor:
                     self.visual.message("Looking for candidate entries for dangling pdf {}/{}: [{}]".format(i+1, len(unmatched), filename))
                     filename = re.sub("[{}]".format(string.punctuation), " ", filename)
                     # titles
-                    res = self.visual.search(filename, all_titles, 5)
-                    ids = [entry_collection.title2id[r[0][0]] for r in res]
-                    titles = [r[0][0] for r in res]
+                    res = process.extract(filename, all_titles, limit=5)
+                    ids = [entry_collection.title2id[r[0]] for r in res]
+                    titles = [r[0] for r in res]
                     results = list(zip(ids, titles))
 
                     # authors
-                    res = self.visual.search(filename, all_authors, 5)
-                    ids = list(set([ID for r in res for ID in entry_collection.author2id[r[0][0]]]))
+                    res = process.extract(filename, all_authors, limit=5)
+                    ids = list(set([ID for r in res for ID in entry_collection.author2id[r[0]]]))
                     titles = [entry_collection.entries[ID].title for ID in ids]
                     results += list(zip(ids, titles))
 
@@ -180,7 +237,7 @@ class Editor:
                         if entry.has_file():
                             if not self.visual.yes_no("Overwrite existing file {} ?".format(entry.file)):
                                 continue
-                        self.make_canonic_pdf_name(entry, upath)
+                        self.make_canonic_pdf_name(upath, entry)
                         entry_collection.set_modified()
 
 
@@ -189,38 +246,103 @@ class Editor:
         missing_per_entry, missing_per_field = entry_collection.check_for_missing_fields()
         if missing_per_entry:
             self.visual.message("Missing {} distinct fields from {} entries".format(len(missing_per_field), len(missing_per_entry)))
-            if self.visual.yes_no("Search bibtexs to complete the entries?"):
-                gt = Getter(self.config)
-                for eidx, (entryid, fields) in enumerate(missing_per_entry.items()):
-                    # search by title
-                    title = entry_collection.entries[entryid].title
-                    results = gt.get_web_bibtex(title)
-                    self.visual.print_entry_contents(entry_collection.entries[entryid])
-                    for field in fields:
-                        useful_results = []
-                        for res in results:
-                            if field in res:
-                                useful_results.append(res)
-                        # show results for the entry that contain the missing field
-                        self.visual.print("Entry {}/{} - [{}]: [{}], missing field: {}, {} candidates with such information.".format(eidx, len(missing_per_entry), entryid, title, field, len(useful_results)))
-                        if not useful_results:
-                            continue
-                        while True:
-                            listcols = [list(u.items()) for u in useful_results]
-                            _, selected_ids = self.visual.user_multifilter(listcols, header='keys attributes'.split(), print_func=self.visual.print_multiline_items)
-                            if len(selected_ids) > 1:
-                                self.visual.error("Selected: {}, need to select at most one candidate.".format(selected_ids))
-                                continue
-                            break
-                        if not selected_ids:
-                            if not self.visual.yes_no("Continue?"):
-                                return
+            what = self.visual.ask_user("Search bibtexs to complete the entries?", "*yes batch no")
+            if utils.matches(what, "no"):
+                return
+            gt = Getter(self.config)
+            if not gt.bibtex_getter_configured():
+                return
+            # search by title, fetching the results of upcoming entries while the current one is reviewed
+            titles = [entry_collection.entries[entryid].title for entryid in missing_per_entry]
+            fetch = lambda title: gt.get_web_bibtex(title, show_candidates=False)
+            prefetched = self.iter_prefetched(titles, fetch, self.config.get_user_setting("prefetch_size", default=4))
+            if utils.matches(what, "batch"):
+                self.complete_missing_fields_batch(entry_collection, missing_per_entry, prefetched)
+                return
+            for eidx, ((entryid, fields), (title, results)) in enumerate(zip(missing_per_entry.items(), prefetched)):
+                if results is None:
+                    results = []
+                self.visual.print_entry_contents(entry_collection.entries[entryid])
+                for field in fields:
+                    useful_results = []
+                    for res in results:
+                        if field in res:
+                            useful_results.append(res)
+                    # show results for the entry that contain the missing field
+                    self.visual.print("Entry {}/{} - [{}]: [{}], missing field: {}, {} candidates with such information.".format(eidx, len(missing_per_entry), entryid, title, field, len(useful_results)))
+                    if not useful_results:
+                        continue
+                    while True:
+                        listcols = [list(u.items()) for u in useful_results]
+                        _, selected_ids = self.visual.user_multifilter(listcols, header='keys attributes'.split(), print_func=self.visual.print_multiline_items)
+                        if len(selected_ids) > 1:
+                            self.visual.error("Selected: {}, need to select at most one candidate.".format(selected_ids))
                             continue
+                        break
+                    if not selected_ids:
+                        if not self.visual.yes_no("Continue?"):
+                            return
+                        continue
 
-                        result = [useful_results[i] for i in selected_ids][0]
-                        self.visual.print("Setting entry field [{}] to [{}]".format(field, result[field]))
-                        entry_collection.entries[entryid].set_dict_value(field, result[field])
-                        entry_collection.set_modified()
+                    result = [useful_results[i] for i in selected_ids][0]
+                    self.visual.print("Setting entry field [{}] to [{}]".format(field, result[field]))
+                    entry_collection.entries[entryid].set_dict_value(field, result[field])
+                    entry_collection.set_modified()
+
+    def fetch_capturing_output(self, fetch, query):
+        """Fetch on a worker thread, collecting its output instead of drawing it over the prompts of the main thread"""
+        with self.visual.capture_output() as output:
+            try:
+                return fetch(query), None, output
+            except Exception as ex:
+                return None, ex, output
+
+    def iter_prefetched(self, queries, fetch, window):
+        """Yield (query, result) tuples in order, fetching the results of the next window queries in the background"""
+        queries = iter(queries)
+        executor = ThreadPoolExecutor(max_workers=window)
+        pending = deque((q, executor.submit(self.fetch_capturing_output, fetch, q)) for q in islice(queries, window))
+        try:
+            while pending:
+                query, future = pending.popleft()
+                for nxt in islice(queries, 1):
+                    pending.append((nxt, executor.submit(self.fetch_capturing_output, fetch, nxt)))
+                result, error, output = future.result()
+                # the fetch output is shown along with its result
+                self.visual.show_output(output)
+                if error is not None:
+                    self.visual.error("Failed to fetch results for [{}]: {}".format(query, error))
+                yield query, result
+        finally:
+            # drop prefetches not consumed, e.g. when the user stops early
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def complete_missing_fields_batch(self, entry_collection, missing_per_entry, prefetched):
+        """Fill missing fields from the candidates with a title similar enough to the entry, writing a report"""
+        threshold = self.config.get_user_setting("autocomplete_similarity", default=90)
+        report = {"completed": [], "skipped": []}
+        for eidx, ((entryid, fields), (title, results)) in enumerate(zip(missing_per_entry.items(), prefetched)):
+            entry = entry_collection.entries[entryid]
+            # best matching candidate first
+            scored = [(fuzz.ratio(normalize_title(title), normalize_title(result_field(res, "title") or "")), res) for res in results or []]
+            scored.sort(key=lambda x: x[0], reverse=True)
+            for field in fields:
+                candidates = [(score, res) for (score, res) in scored if result_field(res, field)]
+                if not candidates or candidates[0][0] < threshold:
+                    best = candidates[0][0] if candidates else None
+                    report["skipped"].append({"ID": entry.ID, "field": field, "best_similarity": best})
+                    continue
+                score, res = candidates[0]
+                value = result_field(res, field)
+                entry.set_dict_value(field, value)
+                entry_collection.set_modified()
+                report["completed"].append({"ID": entry.ID, "field": field, "value": value,
+                                            "candidate_title": result_field(res, "title"), "similarity": score})
+                self.visual.log("Entry {}/{} - [{}]: set {} to [{}], title similarity {}.".format(eidx + 1, len(missing_per_entry), entry.ID, field, value, score))
+        report_path = join(self.config.get_tmp_dir(), "missing_fields_report.json")
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        self.visual.message("Completed {} and skipped {} missing fields, report written to {}".format(len(report["completed"]), len(report["skipped"]), report_path))
 
 
     def check_consistency(self, entry_collection):
@@ -327,11 +449,15 @@ class Editor:
     def get_entry_canonic_pdf_path(self, entry):
         return join(self.pdf_dir, entry.get_canonic_filename())
 
-    def check_entry_canonic_pdf_path(self, entry):
+    def check_entry_canonic_pdf_path(self, entry, pdf_paths=None):
+        """Check the entry file is canonic, looking it up in the scanned pdf paths if available"""
         if not entry.has_file():
             return True
         # return join(self.pdf_dir, entry.get_canonic_filename()) == entry.file
-        return (entry.get_canonic_filename() == entry.file) and exists(join(self.pdf_dir, entry.file))
+        if entry.get_canonic_filename() != entry.file:
+            return False
+        path = join(self.pdf_dir, entry.file)
+        return path in pdf_paths if pdf_paths is not None else exists(path)
 
     def make_canonic_pdf_name(self, file_path, entry, do_ask=True):
         proper_path = self.get_entry_canonic_pdf_path(entry)
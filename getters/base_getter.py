@@ -1,9 +1,12 @@
 import re
 import string
-from urllib.request import urlretrieve
+
+from getters.http_session import HttpSession
 
 
 class BaseGetter:
+    # persistent response cache, shared by all getters
+    response_cache = None
 
     def __init__(self, visual):
         self.visual = visual
@@ -23,10 +26,16 @@ class BaseGetter:
     def configure(self, params):
         pass
 
+    def cached(self, kind, query, func):
+        """Get the response of func for the query, through the response cache if one is set up"""
+        if BaseGetter.response_cache is None:
+            return func()
+        return BaseGetter.response_cache.cached("{}:{}".format(self.name, kind), query, func)
+
     def get_web_bibtex(self, query):
         try:
             self.visual.log("Searching bibtex with {}...".format(self.name))
-            res = self.get_bibtex(query)
+            res = self.cached("bibtex", query, lambda: self.get_bibtex(query))
         except Exception as ex:
             self.visual.error("Failed to complete the bibtex-fetching query. Reason: {}".format(ex))
             return []
@@ -38,8 +47,7 @@ class BaseGetter:
     def download_web_pdf(self, web_path, output_path):
         self.visual.log("Fetching {} to {}.".format(web_path, output_path))
         try:
-            urlretrieve(web_path, output_path)
-            return output_path
+            return HttpSession.download(web_path, output_path)
         except ValueError as ex:
             self.visual.error(ex)
             return None
@@ -2,9 +2,9 @@ import json
 import re
 from urllib.parse import quote, quote_plus
 
-import bibsonomy
 import utils
 from getters.base_getter import BaseGetter
+from getters.http_session import HttpSession
 
 
 class BibsonomyGetter(BaseGetter):
@@ -12,6 +12,7 @@ class BibsonomyGetter(BaseGetter):
     def __init__(self, visual):
         super().__init__(visual)
         self.base_url = "https://www.bibsonomy.org/search/"
+        self.api_url = "https://www.bibsonomy.org/api/"
         self.needs_params = True
         self.ignore_keys = "intrahash interhash href misc bibtexAbstract".split()
         self.dont_preproc_keys = "author".split()
@@ -49,12 +50,11 @@ class BibsonomyGetter(BaseGetter):
 
     def get_bibtex(self, query):
         self.visual.log("Fetching bibsonomy content for query: [{}]".format(query))
-        rs = bibsonomy.RestSource(self.username, self.api_key)
         query = self.process_query(query)
-        # def func(q, start=0, end=1000):
-        #     return rs._get("/posts?resourcetype=" + quote(rs._get_resource_type("publication")) + "&search={}".format(q))
-        res = rs._get("/posts?resourcetype=" + quote(rs._get_resource_type("publication")) + "&search={}".format(quote_plus(query)))
-        res = json.loads(res)
+        # query the rest api over the shared session, instead of a new connection per query
+        resp = HttpSession.request(self.api_url + "posts", auth=(self.username, self.api_key),
+                                   params={"resourcetype": "bibtex", "search": query, "format": "json"})
+        res = json.loads(resp.text)
         if res['stat'] != 'ok':
             self.visual.error("Error fetching bibsonomy query '{}' : {}".format(query, res['stat']))
             return None
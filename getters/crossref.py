@@ -1,8 +1,7 @@
 from urllib.parse import quote, quote_plus
 
-import requests
-
 from getters.base_getter import BaseGetter
+from getters.http_session import HttpSession
 
 
 class Crossref(BaseGetter):
@@ -14,8 +13,11 @@ class Crossref(BaseGetter):
 
 
     def get_doi(self, query):
+        return self.cached("doi", query, lambda: self.request_doi(query))
+
+    def request_doi(self, query):
         suff = "?query.bibliographic=" + query + "&select=title,author,DOI&sort=score&order=desc"
-        resp = requests.get(self.base_url + suff)
+        resp = HttpSession.request(self.base_url + suff)
         msg = resp.json()["message"]
         if resp.status_code != 200:
             self.visual.error(msg)
@@ -24,7 +26,7 @@ class Crossref(BaseGetter):
         if not data:
             return None
         for d in data:
-            print(d["title"], d["DOI"])
+            self.visual.print("{} {}".format(d["title"], d["DOI"]))
         data = data[0]
         try:
             return data["DOI"]
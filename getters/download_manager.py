@@ -0,0 +1,127 @@
+"""Module for concurrent pdf downloads"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from os.path import basename, exists, getsize
+
+import utils
+from getters.http_session import HttpSession
+
+
+class DownloadManager:
+    """Bounded pool of file downloads, resuming partial files and deduplicating identical contents"""
+    part_suffix = ".part"
+    chunk_size = 1 << 16
+    # report progress every that many percent, or megabytes for unknown sizes
+    progress_step = 25
+
+    def __init__(self, visual, num_workers=4):
+        self.visual = visual
+        self.num_workers = num_workers
+        # content digest to path of the files downloaded so far
+        self.digests = {}
+        self.lock = threading.Lock()
+
+    def report_progress(self, name, done, total, last_reported):
+        """Log the download progress of a file, returning the last reported step"""
+        if total:
+            step = 100 * done // total // self.progress_step
+            if step > last_reported:
+                self.visual.log("Downloading {}: {}% of {} bytes".format(name, step * self.progress_step, total))
+            return step
+        step = done // (self.progress_step << 20)
+        if step > last_reported:
+            self.visual.log("Downloading {}: {} bytes".format(name, done))
+        return step
+
+    def fetch(self, url, output_path):
+        """Download the url to a partial file, resuming from its existing bytes, and return the partial file path"""
+        part_path = output_path + self.part_suffix
+        offset = getsize(part_path) if exists(part_path) else 0
+        headers = {"Range": "bytes={}-".format(offset)} if offset else {}
+        name = basename(output_path)
+        with HttpSession.request(url, stream=True, headers=headers) as resp:
+            if offset and resp.status_code == 416:
+                # the partial file is already complete
+                return part_path
+            resp.raise_for_status()
+            if offset and resp.status_code != 206:
+                # no range support, start over
+                self.visual.log("Server does not support resuming {}, restarting.".format(name))
+                offset = 0
+            elif offset:
+                self.visual.log("Resuming {} from byte {}.".format(name, offset))
+            total = int(resp.headers.get("Content-Length", 0))
+            total = total + offset if total else None
+            done, reported = offset, 0
+            with open(part_path, "ab" if offset else "wb") as f:
+                for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+                    done += len(chunk)
+                    reported = self.report_progress(name, done, total, reported)
+        return part_path
+
+    def free_path(self, path):
+        """Get a non-existing path, numbering the file name of the input one"""
+        stem, ext = os.path.splitext(path)
+        num = 1
+        while exists("{}_{}{}".format(stem, num, ext)):
+            num += 1
+        return "{}_{}{}".format(stem, num, ext)
+
+    def download(self, url, output_path):
+        """Download a file, returning its path and whether it is the path of an identical file downloaded before it
+
+        The url may be a callable resolving it, called within the worker.
+        A different existing file at the output path is kept, with the download written next to it.
+        """
+        if callable(url):
+            url = url()
+            if url is None:
+                raise ValueError("could not resolve a download url for {}".format(basename(output_path)))
+        part_path = self.fetch(url, output_path)
+        digest = utils.file_hash(part_path, algorithm="sha256")
+        is_present = exists(output_path) and utils.file_hash(output_path, algorithm="sha256") == digest
+        with self.lock:
+            duplicate = self.digests.get(digest)
+            if duplicate is None:
+                # the file is in place before identical downloads can point to it
+                if is_present:
+                    os.remove(part_path)
+                else:
+                    if exists(output_path):
+                        kept_path, output_path = output_path, self.free_path(output_path)
+                        self.visual.log("Existing {} differs from the download, which is written to {}.".format(kept_path, output_path))
+                    os.replace(part_path, output_path)
+                self.digests[digest] = output_path
+        if duplicate is not None:
+            os.remove(part_path)
+            self.visual.log("Downloaded {} is identical to {}, using the latter.".format(basename(output_path), duplicate))
+            return duplicate, True
+        self.visual.log("Downloaded {}.".format(output_path))
+        return output_path, False
+
+    def download_all(self, jobs, on_complete):
+        """Download (key, url, output path) jobs concurrently
+
+        on_complete is called in the calling thread with the key and path of each completed download,
+        which is the path of an identical file for duplicate downloads,
+        or a numbered path next to the output one if a different file exists there.
+        Returns the keys of the failed and duplicate downloads.
+        """
+        failed, duplicates = [], []
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            futures = {executor.submit(self.download, url, output_path): key for (key, url, output_path) in jobs}
+            for i, future in enumerate(as_completed(futures)):
+                key = futures[future]
+                try:
+                    path, is_duplicate = future.result()
+                except Exception as ex:
+                    self.visual.error("Failed to download pdf for {}: {}".format(key, ex))
+                    failed.append(key)
+                    continue
+                self.visual.log("Completed download {}/{}: {}".format(i + 1, len(futures), key))
+                if is_duplicate:
+                    duplicates.append(key)
+                on_complete(key, path)
+        return failed, duplicates
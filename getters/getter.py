@@ -4,7 +4,11 @@ from os import makedirs
 from os.path import exists, join
 
 import utils
+from getters.base_getter import BaseGetter
+from getters.download_manager import DownloadManager
 from getters.getterFactory import GetterFactory
+from getters.multi_getter import MultiGetter, result_field
+from getters.response_cache import ResponseCache
 from visual import instantiator
 
 
@@ -16,6 +20,8 @@ class Getter:
         self.browser = "firefox"
 
         self.bibtex_api, self.pdf_api = None, None
+        # concurrent querying of multiple bibtex getters
+        self.multi_bibtex_api = None
         self.configure()
 
     def instantiate(self, name):
@@ -33,6 +39,7 @@ class Getter:
         if self.num_retrieved_bibtex is None:
             self.num_retrieved_bibtex = 5
             
+        self.setup_response_cache()
         # instantiate user selections
         self.instantiate_selected_apis()
 
@@ -41,6 +48,21 @@ class Getter:
             self.visual.error("Pdf directory {} does not exist nor could it be created.".format(self.pdf_dir))
 
 
+    def setup_response_cache(self):
+        """Share a persistent response cache among the getters, unless disabled with a zero size"""
+        if BaseGetter.response_cache is not None:
+            return
+        max_entries = self.config.get_user_setting("response_cache_size", default=5000)
+        if not max_entries:
+            return
+        ttl = self.config.get_user_setting("response_cache_ttl", default=7 * 24 * 3600)
+        try:
+            makedirs(self.config.get_tmp_dir(), exist_ok=True)
+            path = join(self.config.get_tmp_dir(), "responses.sqlite")
+            BaseGetter.response_cache = ResponseCache(path, self.visual, ttl=ttl, max_entries=max_entries)
+        except Exception as ex:
+            self.visual.error("Failed to set up the getter response cache: {}".format(ex))
+
     def instantiate_selected_apis(self):
         try:
             name, params = self.config.get_user_setting("pdf_getter"), self.config.get_user_setting("pdf_getter_params")
@@ -56,6 +78,24 @@ class Getter:
             pass
         except Exception:
             self.visual.error("Failed to instantiate  bibtex api: [{}] with supplied params: {}.".format(name, params))
+        self.instantiate_multi_bibtex_api()
+
+    def instantiate_multi_bibtex_api(self):
+        """Set up the getters to query concurrently for bibtexs, if configured as a name to params mapping"""
+        getters = self.config.get_user_setting("bibtex_getters")
+        if not getters:
+            return
+        apis = {}
+        for name, params in getters.items():
+            try:
+                api = self.instantiate_api(name, params)
+            except Exception:
+                self.visual.error("Failed to instantiate bibtex api: [{}] with supplied params: {}.".format(name, params))
+                continue
+            if api is not None:
+                apis[name] = api
+        timeouts = self.config.get_user_setting("bibtex_getter_timeouts", default={})
+        self.multi_bibtex_api = MultiGetter(apis, self.visual, timeouts, max_per_getter=self.num_retrieved_bibtex)
 
 
     def bibtex_api_configured(self):
@@ -97,7 +137,19 @@ class Getter:
             return False
         return True
 
-    def get_web_bibtex(self, query):
+    def show_bibtex_candidates(self, getter_name, results):
+        """Print candidates as they arrive from a getter"""
+        for res in results:
+            title, year = result_field(res, "title"), result_field(res, "year")
+            self.visual.print("[{}] {}{}".format(getter_name, title, " ({})".format(year) if year else ""))
+
+    def bibtex_getter_configured(self):
+        return self.multi_bibtex_api is not None or self.bibtex_api_configured()
+
+    def get_web_bibtex(self, query, show_candidates=True):
+        if self.multi_bibtex_api is not None:
+            on_results = self.show_bibtex_candidates if show_candidates else None
+            return self.multi_bibtex_api.get_web_bibtex(query, on_results=on_results)
         if not self.bibtex_api_configured():
             return None
         res = self.bibtex_api.get_web_bibtex(query)
@@ -110,8 +162,24 @@ class Getter:
         return self.pdf_api.download_web_pdf(web_path, local_output_path)
 
     def search_web_pdf(self, entry_id, entry_title, entry_year):
-        breakpoint()
         if not self.pdf_api_configured():
             return None
         pdf_web_path = self.pdf_api.search_pdf(entry_title, entry_year)
         return self.download_web_pdf(pdf_web_path, entry_id)
+
+    def get_download_manager(self):
+        return DownloadManager(self.visual, num_workers=self.config.get_user_setting("download_workers", default=4))
+
+    def download_web_pdfs(self, urls, on_complete):
+        """Download the pdfs of an entry id to url mapping concurrently, calling on_complete(entry_id, path) per download"""
+        jobs = [(entry_id, url, join(self.pdf_dir, "{}.pdf".format(entry_id))) for (entry_id, url) in urls.items()]
+        return self.get_download_manager().download_all(jobs, on_complete)
+
+    def search_web_pdfs(self, queries, on_complete):
+        """Search and download the pdfs of an entry id to (title, year) mapping concurrently"""
+        if not self.pdf_api_configured():
+            return None
+        # pdf urls are resolved within the download workers
+        urls = {entry_id: (lambda title=title, year=year: self.pdf_api.search_pdf(title, year))
+                for (entry_id, (title, year)) in queries.items()}
+        return self.download_web_pdfs(urls, on_complete)
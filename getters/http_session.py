@@ -0,0 +1,60 @@
+"""Module for the pooled http session shared by the getters"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HttpSession:
+    """Keep-alive session with per-host connection pools and retries with backoff"""
+    # hosts to keep connection pools for
+    num_pools = 10
+    # connections kept alive per host, blocking when all are in use
+    connections_per_host = 4
+    # retries on connection errors and transient statuses, sleeping backoff * 2^retry seconds in between
+    num_retries = 3
+    backoff = 0.5
+    retry_statuses = (429, 500, 502, 503, 504)
+    # seconds to wait for connecting / reading responses
+    timeout = (5, 30)
+    user_agent = "bibterm"
+
+    session = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def make_session():
+        retry = Retry(total=HttpSession.num_retries, backoff_factor=HttpSession.backoff,
+                      status_forcelist=HttpSession.retry_statuses, allowed_methods=frozenset(["GET", "HEAD"]),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=HttpSession.num_pools, pool_maxsize=HttpSession.connections_per_host,
+                              max_retries=retry, pool_block=True)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["User-Agent"] = HttpSession.user_agent
+        return session
+
+    @staticmethod
+    def get():
+        """Get the shared session, creating it on first use"""
+        with HttpSession.lock:
+            if HttpSession.session is None:
+                HttpSession.session = HttpSession.make_session()
+            return HttpSession.session
+
+    @staticmethod
+    def request(url, **kwargs):
+        kwargs.setdefault("timeout", HttpSession.timeout)
+        return HttpSession.get().get(url, **kwargs)
+
+    @staticmethod
+    def download(url, output_path, chunk_size=1 << 16):
+        """Stream the url contents to the output path"""
+        with HttpSession.request(url, stream=True) as resp:
+            resp.raise_for_status()
+            with open(output_path, "wb") as f:
+                for chunk in resp.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+        return output_path
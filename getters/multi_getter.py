@@ -0,0 +1,120 @@
+"""Module for querying multiple bibtex getters concurrently"""
+import queue
+import re
+import string
+import threading
+import time
+from contextlib import nullcontext
+
+
+def normalize_title(title):
+    """Lowercase a title, dropping latex braces, punctuation and repeated whitespace"""
+    title = re.sub("[{}]", "", title.lower())
+    title = re.sub("[" + re.escape(string.punctuation) + "]", " ", title)
+    return " ".join(title.split())
+
+
+def result_field(result, field):
+    """Get a field of a getter result, which is either a fields dict or a raw bibtex string"""
+    if isinstance(result, dict):
+        value = result.get(field)
+        if value is None:
+            value = result.get(field.upper())
+        return value if isinstance(value, str) else None
+    match = re.search(r"^\s*" + field + r"\s*=\s*[{\"](.+?)[}\"]\s*,?\s*$", result, flags=re.IGNORECASE | re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def result_keys(result):
+    """Get the DOI / normalized title keys identifying a getter result"""
+    keys = []
+    doi = result_field(result, "doi")
+    if doi:
+        keys.append(("doi", doi.strip().lower()))
+    title = result_field(result, "title")
+    if title:
+        keys.append(("title", normalize_title(title)))
+    return keys
+
+
+class MultiGetter:
+    """Fan-out of bibtex queries to multiple getters, each within its own timeout"""
+    # seconds to wait on a getter without a configured timeout
+    default_timeout = 10
+
+    def __init__(self, apis, visual, timeouts=None, max_per_getter=None):
+        """
+        apis: getter name to getter instance mapping
+        timeouts: getter name to timeout seconds mapping
+        """
+        self.apis = apis
+        self.visual = visual
+        self.timeouts = timeouts if timeouts is not None else {}
+        self.max_per_getter = max_per_getter
+
+    def get_timeout(self, name):
+        return self.timeouts.get(name, self.default_timeout)
+
+    def run_getter(self, name, api, query, results, output):
+        """Query a getter, posting its (name, results, error) tuple to the results queue
+
+        output: list collecting the output of the querying thread, if it captures it
+        """
+        with self.visual.capture_output(output) if output is not None else nullcontext():
+            try:
+                results.put((name, api.get_web_bibtex(query), None))
+            except Exception as ex:
+                results.put((name, None, ex))
+
+    def iter_results(self, query):
+        """Yield (getter name, results) tuples, in the order the getters complete within their timeouts"""
+        if not self.apis:
+            return
+        results = queue.Queue()
+        start = time.monotonic()
+        deadlines = {name: start + self.get_timeout(name) for name in self.apis}
+        output = self.visual.get_captured_output()
+        for name, api in self.apis.items():
+            # daemon threads, as getters that timed out are left to finish in the background without blocking exit
+            threading.Thread(target=self.run_getter, args=(name, api, query, results, output), daemon=True, name="getter-" + name).start()
+        pending = set(self.apis)
+        while pending:
+            now = time.monotonic()
+            for name in [n for n in pending if deadlines[n] <= now]:
+                self.visual.log("Getter {} timed out after {} seconds.".format(name, self.get_timeout(name)))
+                pending.remove(name)
+            if not pending:
+                break
+            try:
+                name, res, error = results.get(timeout=min(deadlines[n] for n in pending) - now)
+            except queue.Empty:
+                continue
+            if name not in pending:
+                # completed after its timeout
+                continue
+            pending.remove(name)
+            if error is not None:
+                self.visual.error("Getter {} failed: {}".format(name, error))
+                continue
+            yield name, res[:self.max_per_getter] if res else []
+
+    def get_web_bibtex(self, query, on_results=None):
+        """Query all getters, deduplicating results by DOI or normalized title
+
+        on_results is called with the getter name and its new results as each getter completes.
+        """
+        seen, results = set(), []
+        for name, res in self.iter_results(query):
+            new_results = []
+            for result in res:
+                keys = result_keys(result)
+                if any(k in seen for k in keys):
+                    continue
+                seen.update(keys)
+                new_results.append(result)
+            self.visual.log("Getter {} returned {} result(s), {} new.".format(name, len(res), len(new_results)))
+            if new_results:
+                results.extend(new_results)
+                if on_results is not None:
+                    on_results(name, new_results)
+        return results
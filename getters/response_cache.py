@@ -0,0 +1,79 @@
+"""Module for caching getter responses on disk"""
+import pickle
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """SQLite store of getter responses, keyed by getter and normalized query
+
+    Responses expire after ttl seconds and the least recently used ones are evicted beyond max_entries.
+    """
+    def __init__(self, path, visual, ttl=7 * 24 * 3600, max_entries=5000):
+        self.path = path
+        self.visual = visual
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # the connection is shared among the threads of concurrent getters
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS responses "
+                                    "(getter TEXT, query TEXT, value BLOB, created REAL, accessed REAL, "
+                                    "PRIMARY KEY (getter, query))")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self.connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+
+    @staticmethod
+    def normalize_query(query):
+        return " ".join(str(query).lower().split())
+
+    def get(self, getter, query):
+        """Get a (found, response) tuple for the getter query"""
+        query = self.normalize_query(query)
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT value, created FROM responses WHERE getter = ? AND query = ?",
+                                          (getter, query)).fetchone()
+            if row is None:
+                return False, None
+            value, created = row
+            if created < now - self.ttl:
+                self.connection.execute("DELETE FROM responses WHERE getter = ? AND query = ?", (getter, query))
+                return False, None
+            self.connection.execute("UPDATE responses SET accessed = ? WHERE getter = ? AND query = ?", (now, getter, query))
+        return True, pickle.loads(value)
+
+    def put(self, getter, query, value):
+        query = self.normalize_query(query)
+        now = time.time()
+        value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (getter, query, value, now, now))
+            num_entries = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if num_entries > self.max_entries:
+                self.connection.execute("DELETE FROM responses WHERE rowid IN "
+                                        "(SELECT rowid FROM responses ORDER BY accessed LIMIT ?)",
+                                        (num_entries - self.max_entries,))
+
+    def cached(self, getter, query, func):
+        """Get the response of func for the getter query, calling it only on cache misses
+
+        None responses are not cached, as getters return them on failures.
+        """
+        try:
+            found, value = self.get(getter, query)
+        except Exception as ex:
+            self.visual.log(f"Failed to read the response cache {self.path}: {ex}")
+            found = False
+        if found:
+            self.visual.log("Using cached {} response for query: [{}]".format(getter, query))
+            return value
+        value = func()
+        if value is not None:
+            try:
+                self.put(getter, query, value)
+            except Exception as ex:
+                self.visual.log(f"Failed to write the response cache {self.path}: {ex}")
+        return value
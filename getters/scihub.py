@@ -1,9 +1,8 @@
-import os
 import re
-from urllib.request import urlretrieve
 
 from getters.base_getter import BaseGetter
 from getters.crossref import Crossref
+from getters.http_session import HttpSession
 
 
 class ScihubGetter(BaseGetter):
@@ -17,19 +16,19 @@ class ScihubGetter(BaseGetter):
         return []
 
     def search_pdf(self, entry_title, entry_year):
+        return self.cached("pdf", entry_title + " " + entry_year, lambda: self.request_pdf_url(entry_title, entry_year))
+
+    def request_pdf_url(self, entry_title, entry_year):
         # get DOI
         self.visual.log("Looking for entry DOI...")
         doi = self.doi_getter.get_doi(entry_title + " " + entry_year)
         scihub_doc_url = self.base_url + doi
         self.visual.log("Scihub document url resolved to {}".format(scihub_doc_url))
         # download html
-        tmpdir = "/tmp/scihub_getter"
-        os.makedirs(tmpdir, exist_ok=True)
         self.visual.log("Parsing pdf path...")
-        dl_html_path = os.path.join(tmpdir, "html_content")
-        urlretrieve(scihub_doc_url, dl_html_path)
-        with open(dl_html_path) as f:
-            content = f.read()
+        resp = HttpSession.request(scihub_doc_url)
+        resp.raise_for_status()
+        content = resp.text
         pdf_paths = re.findall("https://.*\.pdf", content)
         if not len(pdf_paths):
             return None
@@ -0,0 +1,146 @@
+"""Module for indexing pdf files by content hash"""
+import multiprocessing
+import os
+import pickle
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from os.path import exists, join
+
+import utils
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    # fall back to scanning the raw bytes
+    PdfReader = None
+
+
+doi_regex = re.compile(rb"\b(10\.\d{4,9}/[^\s\"'<>()\[\]{}]+)")
+title_regex = re.compile(rb"/Title\s*\(((?:[^()\\]|\\.)*)\)")
+xmp_title_regex = re.compile(rb"<dc:title>.*?<rdf:li[^>]*>(.*?)</rdf:li>", re.DOTALL)
+# bytes of the file scanned for metadata without a pdf parser
+scan_size = 1 << 20
+
+
+def clean_doi(doi):
+    return doi.rstrip(".,;").lower() if doi else None
+
+
+def read_pdf_info(path):
+    """Get the title and DOI of a pdf from its metadata and first page text"""
+    title, doi = None, None
+    if PdfReader is not None:
+        try:
+            reader = PdfReader(path)
+            meta = reader.metadata or {}
+            title = meta.get("/Title")
+            doi = meta.get("/doi") or meta.get("/DOI")
+            if not doi and reader.pages:
+                match = doi_regex.search(reader.pages[0].extract_text().encode("utf-8", errors="ignore"))
+                doi = match.group(1).decode() if match else None
+            return {"title": str(title) if title else None, "doi": clean_doi(str(doi) if doi else None)}
+        except Exception:
+            pass
+    with open(path, "rb") as f:
+        data = f.read(scan_size)
+    match = doi_regex.search(data)
+    if match:
+        doi = match.group(1).decode("latin-1")
+    match = xmp_title_regex.search(data) or title_regex.search(data)
+    if match:
+        title = match.group(1).decode("utf-8", errors="ignore").strip()
+    return {"title": title or None, "doi": clean_doi(doi)}
+
+
+def index_pdf(path):
+    """Get the content hash and information of a pdf, e.g. within a worker process"""
+    try:
+        return utils.file_hash(path, algorithm="sha256"), read_pdf_info(path)
+    except Exception:
+        # unreadable files are left out of the index
+        return None, None
+
+
+class PdfIndex:
+    """Title / DOI information of the pdfs in a directory, cached by content hash
+
+    Files are only re-hashed when their scan metadata changes.
+    """
+    version = 1
+    filename = "pdf_index.pickle"
+
+    def __init__(self, pdf_dir, cache_dir, visual, num_workers=None):
+        self.pdf_dir = pdf_dir
+        self.path = join(cache_dir, self.filename)
+        self.visual = visual
+        self.num_workers = num_workers
+        # file name to (scan metadata, content hash)
+        self.files = {}
+        # content hash to pdf information
+        self.contents = {}
+        self.thread = None
+        self.load()
+
+    def load(self):
+        if not exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+            if state.get("version") == self.version and state.get("dir") == self.pdf_dir:
+                self.files, self.contents = state["files"], state["contents"]
+        except Exception as ex:
+            self.visual.log(f"Failed to read the pdf index {self.path}: {ex}")
+
+    def store(self):
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"version": self.version, "dir": self.pdf_dir, "files": self.files, "contents": self.contents}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as ex:
+            self.visual.log(f"Failed to write the pdf index {self.path}: {ex}")
+
+    def update(self, scanned_files):
+        """Index the scanned name to metadata mapping, hashing new or changed files in a process pool"""
+        files = {name: self.files[name] for name in scanned_files if name in self.files and self.files[name][0] == scanned_files[name]}
+        changed = [name for name in scanned_files if name not in files and name.lower().endswith(".pdf")]
+        if changed:
+            self.visual.log("Indexing {} new or changed pdfs in {}.".format(len(changed), self.pdf_dir))
+            paths = [join(self.pdf_dir, name) for name in changed]
+            # runs in the background scanning thread, which must not be forked
+            with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                for name, (digest, info) in zip(changed, pool.map(index_pdf, paths, chunksize=8)):
+                    if digest is None:
+                        continue
+                    files[name] = (scanned_files[name], digest)
+                    self.contents.setdefault(digest, info)
+        # drop information of contents no longer in the directory
+        digests = {digest for (_, digest) in files.values()}
+        self.contents = {digest: info for (digest, info) in self.contents.items() if digest in digests}
+        self.files = files
+        self.store()
+
+    def update_safely(self, scanned_files):
+        try:
+            self.update(scanned_files)
+        except Exception as ex:
+            self.visual.error(f"Failed to index the pdfs in {self.pdf_dir}: {ex}")
+
+    def start(self, scanned_files):
+        """Update the index in a background thread"""
+        self.thread = threading.Thread(target=self.update_safely, args=(scanned_files,), daemon=True)
+        self.thread.start()
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def get_info(self, name):
+        """Get the title / DOI information of an indexed file"""
+        if name not in self.files:
+            return None
+        return self.contents.get(self.files[name][1])
@@ -0,0 +1,69 @@
+"""Module for scanning the pdf directory"""
+import json
+import os
+from os.path import exists, join
+
+
+class PdfScan:
+    """Single-pass scan of the files in a directory, persisting a snapshot to tell new or changed files
+
+    Each file maps to its (inode, size, mtime) metadata. Files are stat-ed on every scan, since
+    overwriting a file in place changes neither its inode nor the directory mtime.
+    """
+    version = 2
+
+    def __init__(self, pdf_dir, snapshot_path, visual):
+        self.pdf_dir = pdf_dir
+        self.snapshot_path = snapshot_path
+        self.visual = visual
+        # file name to metadata mapping of the last scan
+        self.files = {}
+
+    def load_snapshot(self):
+        if not exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except Exception as ex:
+            self.visual.log(f"Failed to read the pdf scan snapshot {self.snapshot_path}: {ex}")
+            return None
+        if snapshot.get("version") != self.version or snapshot.get("dir") != self.pdf_dir:
+            return None
+        return snapshot
+
+    def store_snapshot(self):
+        snapshot = {"version": self.version, "dir": self.pdf_dir, "files": self.files}
+        tmp_path = self.snapshot_path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as ex:
+            self.visual.log(f"Failed to write the pdf scan snapshot {self.snapshot_path}: {ex}")
+
+    def scan(self):
+        """Get the file name to metadata mapping of the directory"""
+        snapshot = self.load_snapshot()
+        previous = snapshot["files"] if snapshot is not None else {}
+        files, num_changed = {}, 0
+        with os.scandir(self.pdf_dir) as it:
+            for dir_entry in it:
+                if not dir_entry.is_file():
+                    continue
+                st = dir_entry.stat()
+                meta = (st.st_ino, st.st_size, st.st_mtime_ns)
+                if tuple(previous.get(dir_entry.name, ())) != meta:
+                    num_changed += 1
+                files[dir_entry.name] = meta
+        self.visual.log("Scanned {} files in {}, {} new or changed.".format(len(files), self.pdf_dir, num_changed))
+        self.files = files
+        # removed files also change the snapshot
+        if num_changed or len(files) != len(previous):
+            self.store_snapshot()
+        return self.files
+
+    def paths(self):
+        """Full paths of the scanned files"""
+        return {join(self.pdf_dir, name) for name in self.files}
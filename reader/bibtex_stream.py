@@ -0,0 +1,129 @@
+"""Module for streaming bibtex records out of large files"""
+import re
+
+from bibtexparser.bparser import BibTexParser
+
+
+# record types that do not hold entries
+non_entry_types = ("string", "preamble", "comment")
+# the citation key of an entry record
+record_id_regex = re.compile(r"\s*@\s*\w+\s*[{(]\s*([^,\s]+)")
+
+
+def is_entry_record(text):
+    return not text.lstrip()[1:].lstrip().lower().startswith(non_entry_types)
+
+
+def record_depth_change(line, opener, closer):
+    return line.count(opener) - line.count(closer)
+
+
+def iter_records(path, comment_symbol="%"):
+    """Scan a bibtex file record by record, skipping commented lines in the same pass
+
+    Yields (start, end, text) tuples per @-record, with start / end as byte offsets in the file.
+    """
+    start, depth, opened, opener, closer, lines = None, 0, False, None, None, []
+    offset = 0
+    with open(path, "rb") as f:
+        for raw_line in f:
+            line_start = offset
+            offset += len(raw_line)
+            line = raw_line.decode("utf-8", errors="replace")
+            if line.startswith(comment_symbol):
+                continue
+            if start is None:
+                if not line.lstrip().startswith("@"):
+                    # text between records
+                    continue
+                start, lines = line_start, []
+                # records are delimited by the first bracket after the record type
+                brace, paren = line.find("{"), line.find("(")
+                opener, closer = ("(", ")") if paren >= 0 and (brace < 0 or paren < brace) else ("{", "}")
+                depth, opened = 0, False
+            lines.append(line)
+            depth += record_depth_change(line, opener, closer)
+            opened = opened or opener in line
+            if opened and depth <= 0:
+                yield start, offset, "".join(lines)
+                start = None
+    if start is not None:
+        # unterminated last record
+        yield start, offset, "".join(lines)
+
+
+def record_id(text):
+    """Get the citation key of an entry record, or None for non-entry records"""
+    if not is_entry_record(text):
+        return None
+    match = record_id_regex.match(text)
+    return match.group(1) if match else None
+
+
+def scan_record_offsets(path):
+    """Map the lowercase citation keys of a bibtex file to their (start, end) byte offsets"""
+    offsets = {}
+    for start, end, text in iter_records(path):
+        ID = record_id(text)
+        if ID is not None:
+            offsets[ID.lower()] = (start, end)
+    return offsets
+
+
+class RecordParser:
+    """Parser of single bibtex records, keeping @string macros and preambles across records
+
+    Parsing is strict: malformed records raise a ValueError, instead of being skipped.
+    """
+
+    def __init__(self, customization=None):
+        self.parser = BibTexParser()
+        self.parser.customization = customization
+        # entries accumulate over one parse call per record
+        self.parser.expect_multiple_parse = True
+
+    def get_database(self):
+        """The database holding the strings, preambles and comments seen so far"""
+        return self.parser.bib_database
+
+    def parse(self, text, offset=None, num_entries=None):
+        """Parse the entries in the record text, starting at the byte offset of the file, if known
+
+        The text may hold multiple records, with num_entries entry records among them.
+        """
+        try:
+            db = self.parser.parse(text)
+        except Exception as ex:
+            self.parser.bib_database.entries = []
+            raise ValueError("Malformed bibtex record{}: {}".format(offset_str(offset), ex))
+        entries = db.entries
+        db.entries = []
+        if num_entries is None:
+            num_entries = int(is_entry_record(text))
+        if len(entries) < num_entries:
+            # the grammar skips unparsable records as comments
+            raise ValueError("Malformed bibtex record{}: {}".format(offset_str(offset), text.strip()[:100]))
+        return entries
+
+
+def offset_str(offset):
+    return "" if offset is None else " at byte {}".format(offset)
+
+
+def parse_records(records, customization=None, macros=""):
+    """Parse a chunk of (byte offset, text) records, e.g. within a worker process
+
+    The macros text holds the @string definitions of the whole file, as chunks may use ones defined in others.
+    """
+    parser = RecordParser(customization)
+    if macros:
+        parser.parse(macros, num_entries=0)
+    try:
+        return parser.parse("".join(text for (_, text) in records), num_entries=len(records))
+    except ValueError:
+        pass
+    # parse record by record, to report the offset of the malformed one
+    parser = RecordParser(customization)
+    if macros:
+        parser.parse(macros, num_entries=0)
+    return [entry for (offset, text) in records for entry in parser.parse(text, offset)]
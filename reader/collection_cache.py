@@ -0,0 +1,47 @@
+"""Module for caching parsed entry collections on disk"""
+import os
+import pickle
+from os.path import exists, join
+
+import utils
+
+
+class CollectionCache:
+    """Binary cache of a parsed entry collection, keyed by its source file stamp"""
+    # bump when the layout of the cached collection state changes
+    version = 6
+    filename = "collection.pickle"
+
+    def __init__(self, cache_dir, visual):
+        self.visual = visual
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = join(cache_dir, self.filename)
+
+    def load(self, source_path, tags_info):
+        """Load the cached collection state, if it is still valid for the source file and tags"""
+        if not exists(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                # the header is read first, to skip unpickling stale states
+                header = pickle.load(f)
+                if header.get("version") != self.version or header.get("tags") != tags_info:
+                    return None
+                if not utils.stamp_matches(header.get("stamp"), source_path):
+                    return None
+                return pickle.load(f)
+        except Exception as ex:
+            self.visual.log(f"Failed to read the collection cache {self.path}: {ex}")
+            return None
+
+    def store(self, state, source_path, tags_info):
+        """Write the collection state, stamped with the source file it was read from"""
+        header = {"version": self.version, "stamp": utils.file_stamp(source_path), "tags": tags_info}
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except Exception as ex:
+            self.visual.log(f"Failed to write the collection cache {self.path}: {ex}")
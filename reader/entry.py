@@ -2,6 +2,7 @@ import collections
 import json
 import os
 import re
+import sys
 import time
 from collections import OrderedDict
 from os.path import basename, exists, join
@@ -14,28 +15,20 @@ import utils
 from visual.instantiator import setup
 
 class Entry:
-    ENTRYTYPE = None
-    ID = None
-    archiveprefix = None
-    arxivid = None
-    author = None
-    booktitle = None
-    doi = None
-    eprint = None
-    file = None
-    isbn = None
-    issn = None
-    keywords = None
-    link = None
-    number = None
-    pages = None
-    pmid = None
-    publisher = None
-    title = None
-    url = None
-    volume = None
-    year = None
-    inserted = None
+    """Bibtex entry, with the known fields in slots and any other ones in an overflow dict"""
+    # fields held in slots, missing ones reading as None
+    fields = ("ENTRYTYPE", "ID", "archiveprefix", "arxivid", "author", "booktitle", "doi", "eprint", "file",
+              "isbn", "issn", "journal", "keywords", "link", "number", "pages", "pmid", "publisher", "tags",
+              "title", "url", "volume", "year", "inserted")
+    field_set = frozenset(fields)
+    # fields with values repeated across entries, interned to be stored once
+    interned_fields = frozenset(("ENTRYTYPE", "author", "keywords", "tags", "journal", "publisher", "booktitle", "year"))
+    # field order of the entry (shared across entries), overflow dict of other fields (None if empty),
+    # whether the entry changed since last written to the library file, the cached writable form of its fields
+    # and the collection holding it, if any, with the lowercase id it is held under
+    __slots__ = fields + ("key_order", "extra", "modified", "writable_dict", "collection", "collection_id")
+    # distinct field orders, shared among entries
+    key_orders = {}
 
     useful_keys = ["ENTRYTYPE", "ID", "author", "title", "year", "keywords", "file", "tags", "inserted"]
     # keys to show a very short description of the entry
@@ -64,44 +57,120 @@ class Entry:
         return e
 
     def get_value(self, key, postproc=False):
-        try:
-            value = self.raw_dict[key]
-        except KeyError:
-            value = ""
+        value = self.get_field(key) if self.has_field(key) else ""
         if postproc:
             if type(value) is list:
                 value = ",".join([str(x) for x in value])
         return value
 
     def set_dict_value(self, key, value):
-        if key == "pages":
-            self.pages = value
-        elif key == "publisher":
-            self.publisher = value
-        else:
-            pass
-        self.raw_dict[key] = value
+        self.change_field(key, value)
+        self.mark_modified()
+
+    def change_field(self, key, value):
+        """Set a field value, reindexing the entry in the collection that indexes it by its values"""
+        collection = self.collection
+        if collection is not None:
+            collection.unindex_entry(self)
+        self.set_field(key, value)
+        self.writable_dict = None
+        if collection is not None:
+            collection.reindex_entry(self)
+
+    def mark_modified(self):
+        """Register a change of the entry contents"""
+        self.modified = True
+        self.writable_dict = None
 
     def __init__(self, kv):
-        for key in kv:
-            self.__setattr__(key, kv[key])
-        self.raw_dict = kv
+        for field in Entry.fields:
+            setattr(self, field, None)
+        self.extra = None
+        self.modified = False
+        self.writable_dict = None
+        self.collection = None
+        self.collection_id = None
+        self.key_order = Entry.shared_key_order(tuple(kv))
+        for key, value in kv.items():
+            self.store_field(key, value)
+
+    def __getstate__(self):
+        # the collection is reattached when restoring it
+        return {key: getattr(self, key) for key in Entry.__slots__ if key not in ("collection", "collection_id")}
+
+    def __setstate__(self, state):
+        self.collection = None
+        self.collection_id = None
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    def __getattr__(self, key):
+        # only reached for unset slots and fields outside of them
+        if key in Entry.__slots__ or key.startswith("__"):
+            raise AttributeError(key)
+        if self.extra is None or key not in self.extra:
+            raise AttributeError("Entry has no field {}".format(key))
+        return self.extra[key]
+
+    @staticmethod
+    def shared_key_order(keys):
+        return Entry.key_orders.setdefault(keys, keys)
+
+    @staticmethod
+    def intern_value(key, value):
+        if key not in Entry.interned_fields:
+            return value
+        if type(value) == str:
+            return sys.intern(value)
+        if type(value) == list:
+            return [sys.intern(x) if type(x) == str else x for x in value]
+        return value
+
+    def store_field(self, key, value):
+        if key in Entry.field_set:
+            setattr(self, key, Entry.intern_value(key, value))
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def set_field(self, key, value):
+        """Set a field value, adding it to the entry fields if missing"""
+        self.store_field(key, value)
+        if key not in self.key_order:
+            self.key_order = Entry.shared_key_order(self.key_order + (key,))
+
+    def has_field(self, key):
+        return key in self.key_order
+
+    def get_field(self, key):
+        if key in Entry.field_set:
+            return getattr(self, key)
+        return self.extra[key]
+
+    @property
+    def raw_dict(self):
+        """The entry fields, in their original order"""
+        return {key: self.get_field(key) for key in self.key_order}
 
     def consolidate_dict(self):
         """Add entry fields to the raw dictionary"""
-        self.raw_dict["inserted"] = str(self.inserted) if self.inserted is not None else ""
+        inserted = str(self.inserted) if self.inserted is not None else ""
+        if not self.has_field("inserted") or self.inserted != inserted:
+            self.change_field("inserted", inserted)
 
     def get_raw_dict(self):
         return self.raw_dict
 
 
     def get_writable_dict(self):
-        self.make_writable_dict()
+        if self.writable_dict is None:
+            self.make_writable_dict()
         return self.writable_dict
 
     def make_writable_dict(self):
         stringify_keys = ["author", "keywords", "journal", "link"]
-        self.writable_dict = {k: v for (k, v) in self.raw_dict.items()}
+        self.writable_dict = self.raw_dict
         for key in stringify_keys:
             joiner = " and " if key == "author" else ", "
             if key not in self.writable_dict:
@@ -120,7 +189,7 @@ class Entry:
             content = "{" + str(k) + " = " + str(v) + "}"
             s.append(content)
         s = ",\n".join(s)
-        s = "@" + self.raw_dict["ENTRYTYPE"] + "{" + self.raw_dict["ID"] + s + "}"
+        s = "@" + self.ENTRYTYPE + "{" + self.ID + s + "}"
         return s
 
     def has_file(self):
@@ -144,12 +213,10 @@ class Entry:
         return "\\cite{" + self.ID + "}"
 
     def set_file(self, file_path):
-        self.raw_dict["file"] = file_path
-        self.file = file_path
+        self.set_dict_value("file", file_path)
 
     def set_keywords(self, kw):
         self.set_dict_value("keywords", kw)
-        self.keywords = kw
 
     def get_discovery_view(self):
         """Return only information to identify the paper"""
@@ -160,8 +227,8 @@ class Entry:
         if keys is None:
             keys = self.useful_keys
         for key in keys:
-            if key in self.raw_dict:
-                value = self.raw_dict[key]
+            if self.has_field(key):
+                value = self.get_field(key)
                 if compact:
                     # concat. list into a string to display in a single line
                     if type(value) == list:
@@ -188,10 +255,8 @@ class Entry:
         return self.__str__()
 
     def set_title(self, title):
-        self.title = title
         self.set_dict_value("title", title)
 
     def set_id(self, ID):
-        self.ID = ID
         self.set_dict_value("ID", ID)
 
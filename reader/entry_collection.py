@@ -1,9 +1,11 @@
 import collections
 import json
+import math
 import os
 import re
 import time
 from collections import OrderedDict
+from contextlib import nullcontext
 from os.path import basename, exists, join
 
 import bibtexparser
@@ -13,13 +15,21 @@ from bibtexparser.bparser import BibTexParser
 import utils
 from visual.instantiator import setup
 from writer import Writer
+from reader.bibtex_stream import scan_record_offsets
 from reader.entry import Entry
+from reader.indexed_store import IndexedStore
+from reader.sorted_view import SortedView
+from reader.token_index import TokenIndex
 
 class EntryCollection:
     visual = None
     modified_collection = False
     keyword_override_action = None
-    all_pdf_paths = []
+    # file the collection was read from
+    source_path = None
+    # members making up the parsed state of the collection
+    state_keys = ["bibtex_db", "entries", "id_list", "title2id", "author2id", "keyword2id",
+                  "keywords_map", "keywords_discard", "maxlen_id", "maxlen_title", "all_pdf_paths", "token_index"]
 
     def get_tag_information(self):
         return {"keep": list(self.keyword2id.keys()), "map": self.keywords_map}
@@ -32,9 +42,14 @@ class EntryCollection:
         self.entries = {}
         self.maxlen_id = 0
         self.maxlen_title = 0
-        self.id_list = []
-        self.title_list = []
+        # lowercase ids, in collection order
+        self.id_list = IndexedStore()
         self.keywords_discard = set()
+        # files assigned to entries
+        self.all_pdf_paths = set()
+        # tokens of the id, title, author and keywords fields
+        self.token_index = TokenIndex()
+        self.init_runtime_state()
         self.keywords_map = tags_info["map"]
         self.keyword2id = {kw: [] for kw in tags_info["keep"]}
 
@@ -42,22 +57,91 @@ class EntryCollection:
             for value in valuelist:
                 self.keyword2id[value] = []
 
-        # check for duplicate ids
-        all_ids = [x["ID"] for x in bib_db.entries]
-        duplicates = [item for item, count in collections.Counter(all_ids).items() if count > 1]
-        if duplicates:
-            self.visual.error("{} duplicates found in the collection - fix them.\n{}".format(len(duplicates), "\n".join(duplicates)))
-            exit(1)
+        self.check_duplicates([x["ID"] for x in bib_db.entries])
 
         for i in range(len(bib_db.entries)):
             self.entry_index = i
             entry = bib_db.entries[i]
             ent = Entry(entry)
             ent = self.add_entry_to_collection_containers(ent)
+        # the entries hold the parsed fields from now on, the db entry list is only filled on writing
+        bib_db.entries = []
+
+
+    def check_duplicates(self, all_ids):
+        """Exit if the ids of the read entries have duplicates"""
+        duplicates = [item for item, count in collections.Counter(all_ids).items() if count > 1]
+        if duplicates:
+            self.visual.error("{} duplicates found in the collection - fix them.\n{}".format(len(duplicates), "\n".join(duplicates)))
+            exit(1)
 
+    def init_runtime_state(self):
+        """Initialize the members tracking the use of the collection, outside of its parsed state"""
+        # searcher kept up to date with collection changes
+        self.searcher = None
+        # lowercase id to (start, end) byte offsets of the source file records, scanned on demand
+        self.source_offsets = None
+        # size / mtime stamp of the source file, when last read or written
+        self.source_stamp = None
+        # lowercase ids of entries added or replaced since the last write
+        self.dirty_ids = set()
+        # number of lookup updates, to tell when indexes derived from the entries are stale
+        self.change_count = 0
+        # column to the ids presorted by it, built on demand
+        self.sorted_views = {}
+        # lowercase ids of entries changed in place to the ids the searcher knows them by, updated before searching
+        self.stale_search_ids = {}
+
+    def get_state(self):
+        """Get the parsed state of the collection, e.g. for caching"""
+        return {key: getattr(self, key) for key in self.state_keys}
+
+    @staticmethod
+    def from_state(state):
+        """Restore a collection from a parsed state"""
+        collection = EntryCollection.__new__(EntryCollection)
+        collection.init_runtime_state()
+        for key, value in state.items():
+            setattr(collection, key, value)
+        for ID, ent in collection.entries.items():
+            ent.collection, ent.collection_id = collection, ID
+        return collection
+
+    def set_source(self, source_path):
+        """Register the file the collection is consistent with"""
+        self.source_path = source_path
+        self.source_stamp = utils.file_stamp(source_path, with_hash=False)
+        self.source_offsets = None
+
+    def source_unchanged(self, path):
+        """Check whether the input file is the unchanged source of the collection"""
+        return path == self.source_path and utils.stamp_matches(self.source_stamp, path)
+
+    def get_source_offsets(self):
+        """Get the byte offsets of the records in the source file"""
+        if self.source_offsets is None:
+            self.source_offsets = scan_record_offsets(self.source_path)
+        return self.source_offsets
+
+    def get_changed_ids(self):
+        """Get the lowercase ids of the entries that differ from their source file record"""
+        return self.dirty_ids.union(ID for (ID, ent) in self.entries.items() if ent.modified)
+
+    def mark_written(self, path, offsets=None):
+        """Register that the collection was written to the input file, with the resulting record offsets, if known"""
+        for ID in self.get_changed_ids():
+            self.entries[ID].modified = False
+        self.dirty_ids.clear()
+        self.set_source(path)
+        self.source_offsets = offsets
 
     def get_searchable_format(self):
-        return self.bibtex_db.entries_dict
+        return {ent.ID: ent.raw_dict for ent in self.entries.values()}
+
+    def attach_searcher(self, searcher):
+        """Register a searcher to be updated on collection changes"""
+        self.searcher = searcher
+        searcher.set_token_index(self.token_index)
 
     # check and log missing entry elements
     def check_for_missing_fields(self):
@@ -88,56 +172,64 @@ class EntryCollection:
             return len(self.entries), self.maxlen_id, self.maxlen_title
         return len(id_list), max(list(map(len, id_list))), max([len(self.entries[ID].title) for ID in id_list])
 
+    @property
+    def title_list(self):
+        """Lowercase titles, in collection order"""
+        return [self.entries[ID].title.lower() for ID in self.id_list]
+
     def only_keep(self, keep_ids):
-        for ID in self.id_list:
-            if ID in keep_ids:
-                continue
-            title = self.entries[ID].title.lower()
-            self.id_list.remove(ID)
-            del self.entries[ID]
-            self.title_list.remove(title)
-            del self.title2id[title]
+        keep_ids = set(keep_ids)
+        # index updates of the removals are committed at once
+        with self.searcher.batch() if self.searcher is not None else nullcontext():
+            for ID in [x for x in self.id_list if x not in keep_ids]:
+                self.remove(ID, do_modify=False)
 
     def remove(self, ID, do_modify=True):
-        # bibtex_db containers
-        del self.bibtex_db.entries_dict[ID]
-        idx = [i for i in range(len(self.bibtex_db.entries)) if self.bibtex_db.entries[i]["ID"] == ID]
-        if len(idx) != 1:
-            self.visual.error("Mutiple/no indexes with ID {} found to remove: {}.".format(ID, idx))
+        ID = ID.lower()
+        if ID not in self.entries:
+            self.visual.error("No entry with ID {} found to remove.".format(ID))
             exit(1)
-        del self.bibtex_db.entries[idx[0]]
-        self.visual.log(f"Removed ID: {ID}, index: {idx[0]}")
+        entry_id = self.entries[ID].ID
+        if self.searcher is not None:
+            self.searcher.update_remove(self.get_search_id(ID))
         # containers
-        ID = ID.lower()
-        title = self.entries[ID].title.lower()
-        del self.entries[ID]
+        self.remove_entry_from_lookups(ID)
         self.id_list.remove(ID)
-        self.title_list.remove(title)
-        del self.title2id[title]
+        self.dirty_ids.discard(ID)
+        self.visual.log(f"Removed ID: {entry_id}")
         if do_modify:
             self.modified_collection = True
 
     def replace(self, ent, old_id=None):
         if old_id is None:
-            old_id = ent.ID
-        # keep copies of id and title lists to preserve order
-        id_idx = self.id_list.index(old_id.lower())
-        title_idx = self.title_list.index(ent.title.lower())
+            # the entry may have been renamed in place
+            old_id = ent.collection_id if ent.collection is self else ent.ID
+        old_id, new_id = old_id.lower(), ent.ID.lower()
+        if new_id != old_id and new_id in self.entries:
+            self.visual.error(f"Entry {ent.ID} already exists in the collection!")
+            return None
+        # fields are consolidated before indexing, so the indexes hold the final values
+        self.add_entry_to_bibtex_db(ent)
         # remove existing
-        self.remove(old_id)
-        # insert it
-        self.add_entry(ent, can_replace=False)
-        # remove from back
-        self.id_list.pop()
-        self.title_list.pop()
-
-        # restore to list position
-        self.id_list.insert(id_idx, ent.ID.lower())
-        self.title_list.insert(title_idx, ent.title.lower())
+        old_entry_id = self.get_search_id(old_id)
+        self.remove_entry_from_lookups(old_id)
+        # insert it, at the list position of the replaced entry
+        self.id_list.replace(old_id, new_id)
+        # same for its record in the source file
+        if self.source_offsets is not None and old_id in self.source_offsets and new_id not in self.source_offsets:
+            self.source_offsets[new_id] = self.source_offsets.pop(old_id)
+        self.dirty_ids.discard(old_id)
+        self.dirty_ids.add(new_id)
+        self.add_entry_to_lookups(ent)
+        if self.searcher is not None:
+            with self.searcher.batch():
+                self.searcher.update_remove(old_entry_id)
+                self.searcher.update_add(ent.raw_dict)
         self.modified_collection = True
+        return ent
 
     def has_entry(self, entry_id):
-        return entry_id in self.id_list
+        return entry_id.lower() in self.entries
 
     def add_keyword_instance(self, kw, entry_id):
         if kw not in self.keyword2id:
@@ -160,11 +252,14 @@ class EntryCollection:
                 self.visual.error(f"Entry {ent.ID} already exists in the collection!")
                 return None
             # delete existing, to replace
-            self.remove(ent)
+            self.remove(ent.ID)
+        self.add_entry_to_bibtex_db(ent)
         ent = self.add_entry_to_collection_containers(ent)
         if ent is None:
             return ent
-        self.add_entry_to_bibtex_db(ent)
+        self.dirty_ids.add(ent.ID.lower())
+        if self.searcher is not None:
+            self.searcher.update_add(ent.raw_dict)
         self.visual.log(f"Added ID: {ent.ID}")
         return ent
 
@@ -179,28 +274,58 @@ class EntryCollection:
     def add_entry_to_bibtex_db(self, ent):
         """Create a new, non-existing entry"""
 
-        # add additional fields manually to the dict
+        # add additional fields manually to the entry
+        # the db entry list is only synced to the collection on writing
         ent.consolidate_dict()
-        self.bibtex_db.entries.append(ent.raw_dict)
-        # the following updates the entries dict
-        # self.bibtex_db.get_entry_dict()
-        # # make sure it's there
-        # if ent.ID not in self.bibtex_db.entries_dict:
-        #     self.bibtex_db.entries_dict[ent.ID] = ent.raw_dict
 
     def get_entry(self, lookup_id):
         return self.entries[lookup_id.lower()]
 
     def add_entry_to_collection_containers(self, ent):
         """Update utility containers (dicts, lists, etc.) of the entry collection class"""
+        ent = self.add_entry_to_lookups(ent)
+        if ent is not None:
+            self.id_list.append(ent.ID.lower())
+        return ent
 
-        ID = ent.ID.lower()
+    def remove_entry_from_lookups(self, ID):
+        """Remove an entry from the lookup containers, keeping the id list intact"""
+        ent = self.entries.pop(ID)
+        if ent.collection is self:
+            ent.collection, ent.collection_id = None, None
+        self.remove_entry_from_indexes(ID, ent)
+
+    def remove_entry_from_indexes(self, ID, ent):
+        """Remove an entry from the containers indexing its field values"""
         title = ent.title.lower()
+        if self.title2id.get(title) == ID:
+            del self.title2id[title]
+        for auth in ent.author:
+            if ID in self.author2id.get(auth, []):
+                self.author2id[auth].remove(ID)
+        if ent.file:
+            self.all_pdf_paths.discard(ent.file)
+        self.token_index.remove(ID, ent)
+        for view in self.sorted_views.values():
+            view.remove(ID, ent)
+        self.change_count += 1
+
+    def add_entry_to_lookups(self, ent):
+        """Add an entry to the lookup containers, without positioning it in the id list"""
+        ID = ent.ID.lower()
         # update object lookup dict
         if ID in self.entries:
             self.visual.error("Entry with id {} already in entries dict!".format(ID))
             return None
         self.entries[ID] = ent
+        # in-place changes of the entry are reported back to update the indexes
+        ent.collection, ent.collection_id = self, ID
+        self.add_entry_to_indexes(ID, ent)
+        return ent
+
+    def add_entry_to_indexes(self, ID, ent):
+        """Add an entry to the containers indexing its field values"""
+        title = ent.title.lower()
         # update title-id mapping
         self.title2id[title] = ID
         for auth in ent.author:
@@ -208,17 +333,58 @@ class EntryCollection:
                 self.author2id[auth] = []
             self.author2id[auth].append(ID)
 
-        # update ids and titles lists
-        self.id_list.append(ID)
-        self.title_list.append(title)
         # update maximum ID / title lengths
         if len(ent.ID) > self.maxlen_id:
             self.maxlen_id = len(ent.ID)
         if len(ent.title) > self.maxlen_title:
             self.maxlen_title = len(ent.title)
         if ent.file:
-            self.all_pdf_paths.append(ent.file)
-        return ent
+            self.all_pdf_paths.add(ent.file)
+        self.token_index.add(ID, ent)
+        for view in self.sorted_views.values():
+            view.add(ID, ent)
+        self.change_count += 1
+
+    def unindex_entry(self, ent):
+        """Remove an entry about to change in place from the indexes, while they hold its current values"""
+        self.remove_entry_from_indexes(ent.collection_id, ent)
+        if self.searcher is not None:
+            # the searcher is updated once before the next search, instead of per changed field
+            self.stale_search_ids.setdefault(ent.collection_id, ent.ID)
+
+    def reindex_entry(self, ent):
+        """Index an entry changed in place"""
+        self.add_entry_to_indexes(ent.collection_id, ent)
+
+    def get_search_id(self, ID):
+        """Get the id the searcher knows an entry by, dropping any pending in-place change update of it"""
+        return self.stale_search_ids.pop(ID, None) or self.entries[ID].ID
+
+    def update_searcher(self):
+        """Update the searcher with the entries changed in place since the last update, in a single batch"""
+        if self.searcher is None or not self.stale_search_ids:
+            return
+        with self.searcher.batch():
+            for ID, search_id in self.stale_search_ids.items():
+                self.searcher.update_remove(search_id)
+                self.searcher.update_add(self.entries[ID].raw_dict)
+        self.stale_search_ids.clear()
+
+    def get_sorted_view(self, column):
+        if column not in self.sorted_views:
+            self.sorted_views[column] = SortedView(column, self.entries)
+        return self.sorted_views[column]
+
+    def sort_ids(self, ids, column):
+        """Sort lowercase entry ids by a column, via the presorted view of the column
+
+        Ids with equal column values keep their input order.
+        """
+        view = self.get_sorted_view(column)
+        if len(ids) * math.log2(len(ids) + 1) < len(self.entries):
+            # sorting few ids is cheaper than a pass over the view
+            return sorted(ids, key=lambda ID: view.sort_key(self.entries[ID]))
+        return view.order(ids)
 
     def find_ID_(self, thelist, ID):
         for i in range(len(self.entries)):
@@ -226,11 +392,8 @@ class EntryCollection:
                 return i
 
     def get_writable_db(self):
-        for i, entry_dict in enumerate(self.bibtex_db.entries):
-            entry_id = entry_dict["ID"]
-            entry = self.entries[entry_id.lower()]
-            self.bibtex_db.entries[i] = entry.get_writable_dict()
-        self.bibtex_db._make_entries_dict()
+        # sync the db entry list with the collection
+        self.bibtex_db.entries = [self.entries[ID].get_writable_dict() for ID in self.id_list]
         return self.bibtex_db
 
         # stringify_keys = ["author", "keywords", "journal", "link"]
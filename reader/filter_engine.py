@@ -0,0 +1,139 @@
+"""Module for evaluating structured filters over an entry collection"""
+import re
+from bisect import bisect_left, bisect_right
+
+from reader.entry import Entry
+from reader.indexed_store import IndexedStore
+from visual.filterer import Filterer, operators
+
+# comparison operators, longest first so that e.g. ">=" is not read as ">"
+comparison_regex = re.compile(r"^(?P<left>.+?)\s*(?P<op>>=|<=|!=|=|>|<)\s*(?P<right>.+)$")
+# word operators need surrounding whitespace, not to match within operands
+word_operator_regex = re.compile(r"^(?P<left>.+?)\s+(?P<op>sw|ew)\s+(?P<right>.+)$")
+# operator to use when the entry key is the right operand
+flipped_operators = {">": "<", "<": ">", ">=": "<=", "<=": ">=", "=": "=", "!=": "!="}
+
+
+class TypedFilter:
+    """Filter clause comparing an entry field to a constant, both converted to the type of the field"""
+    def __init__(self, key, op_str, constant):
+        self.key = key
+        self.op_str = op_str
+        self.operator = operators[op_str]
+        self.key_type = Entry.key_types.get(key, str)
+        self.constant = self.convert(constant)
+        if self.constant is None:
+            raise ValueError(f"Invalid {self.key_type.__name__} value {constant} for {key}")
+
+    def convert(self, value):
+        """Convert a value to the type of the field, lowercasing strings, or None if not convertible"""
+        if self.key_type is int:
+            try:
+                return int(str(value).strip())
+            except ValueError:
+                return None
+        return str(value).lower()
+
+    def entry_values(self, entry):
+        """Get the converted values of the field of an entry, each element for list fields"""
+        value = entry.get_field(self.key) if entry.has_field(self.key) else None
+        if value is None:
+            return []
+        values = [self.convert(v) for v in (value if isinstance(value, list) else [value])]
+        return [v for v in values if v is not None]
+
+    def satisfied_by(self, entry):
+        values = self.entry_values(entry)
+        if self.op_str == "!=":
+            # no value of a multivalue field may equal the constant
+            return all(v != self.constant for v in values)
+        return any(self.operator(v, self.constant) for v in values)
+
+
+class FilterEngine:
+    """Filter evaluation over an entry collection
+
+    Year clauses are answered from a sorted year array and equality / prefix clauses on tokenized
+    fields from the token index of the collection, so that only their candidates are checked.
+    """
+    def __init__(self, entry_collection):
+        self.entry_collection = entry_collection
+        # collection change count the year index was built at
+        self.indexed_change_count = None
+        self.years, self.year_ids = [], []
+        # lowercase entry key to the entry field
+        self.fields = {f.lower(): f for f in Entry.fields}
+
+    def parse_clause(self, clause):
+        match = word_operator_regex.match(clause) or comparison_regex.match(clause)
+        if match is None:
+            raise ValueError(f"Invalid filter string {clause}")
+        left, op_str, right = match.group("left").strip(), match.group("op"), match.group("right").strip()
+        if left.lower() in self.fields:
+            key, constant = self.fields[left.lower()], right
+        elif right.lower() in self.fields and op_str in flipped_operators:
+            key, constant, op_str = self.fields[right.lower()], left, flipped_operators[op_str]
+        else:
+            raise ValueError(f"Invalid filter string {clause}")
+        return TypedFilter(key, op_str, constant.strip("\"'"))
+
+    def parse_filters(self, filters_str):
+        return [self.parse_clause(clause.strip()) for clause in filters_str.split(Filterer.delimiter) if clause.strip()]
+
+    def update_year_index(self):
+        if self.indexed_change_count == self.entry_collection.change_count:
+            return
+        pairs = []
+        for ID, ent in self.entry_collection.entries.items():
+            try:
+                pairs.append((int(ent.year), ID))
+            except (TypeError, ValueError):
+                continue
+        pairs.sort()
+        self.years = [y for (y, _) in pairs]
+        self.year_ids = [ID for (_, ID) in pairs]
+        self.indexed_change_count = self.entry_collection.change_count
+
+    def year_candidates(self, op_str, year):
+        self.update_year_index()
+        lo, hi = bisect_left(self.years, year), bisect_right(self.years, year)
+        ranges = {"=": (lo, hi), ">": (hi, len(self.years)), ">=": (lo, len(self.years)), "<": (0, lo), "<=": (0, hi)}
+        start, end = ranges[op_str]
+        return set(self.year_ids[start:end])
+
+    def candidates(self, filt):
+        """Get the ids of the entries that may satisfy the filter and whether exactly these do, or None if not indexed"""
+        if filt.key == "year" and filt.op_str in ("=", ">", ">=", "<", "<="):
+            return self.year_candidates(filt.op_str, filt.constant), True
+        token_index = self.entry_collection.token_index
+        if filt.key in token_index.fields and filt.op_str in ("=", "sw"):
+            # values equal to or starting with the constant contain its tokens, the last one as a prefix
+            ids = token_index.match(filt.constant)
+            if ids is not None:
+                return ids, False
+        return None
+
+    def apply(self, filters_str, ids=None):
+        """Get the lowercase ids of the entries satisfying the filters, out of the input ids or the whole collection"""
+        filters = self.parse_filters(filters_str)
+        candidate_ids, remaining = None, []
+        for filt in filters:
+            indexed = self.candidates(filt)
+            if indexed is None:
+                remaining.append(filt)
+                continue
+            found, exact = indexed
+            candidate_ids = found if candidate_ids is None else candidate_ids & found
+            if not exact:
+                remaining.append(filt)
+        if ids is None:
+            ids = self.entry_collection.id_list
+        if candidate_ids is not None:
+            if isinstance(ids, IndexedStore) and len(candidate_ids) < len(ids):
+                # few candidates are put in collection order by position lookups, without a pass over it
+                ids = sorted((ID for ID in candidate_ids if ID in ids), key=ids.index)
+            else:
+                ids = [ID for ID in ids if ID in candidate_ids]
+        entries = self.entry_collection.entries
+        return [ID for ID in ids if all(filt.satisfied_by(entries[ID]) for filt in remaining)]
+
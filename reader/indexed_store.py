@@ -0,0 +1,126 @@
+"""Module for an insertion-ordered key store with positional access"""
+
+
+class IndexedStore:
+    """Insertion-ordered sequence of unique keys
+
+    Membership and in-place key replacement are O(1), positional access, position lookup
+    and removal are O(log n), via a Fenwick tree counting the live slots of the store.
+    """
+    # compact once removed slots exceed that fraction of all slots
+    max_removed_ratio = 0.5
+
+    def __init__(self, keys=None):
+        self.clear()
+        if keys is not None:
+            for key in keys:
+                self.append(key)
+
+    def clear(self):
+        # key per slot, None for removed keys
+        self.slots = []
+        # key to slot mapping
+        self.slot_of = {}
+        # 1-based fenwick tree over the live slot counts
+        self.tree = [0]
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def __contains__(self, key):
+        return key in self.slot_of
+
+    def __iter__(self):
+        return (key for key in self.slots if key is not None)
+
+    def __eq__(self, other):
+        if isinstance(other, (IndexedStore, list, tuple)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return "IndexedStore({})".format(list(self))
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("IndexedStore index out of range")
+        return self.slots[self.find_slot(position)]
+
+    def prefix_count(self, num_slots):
+        """Number of live keys in the first num_slots slots"""
+        count = 0
+        while num_slots > 0:
+            count += self.tree[num_slots]
+            num_slots -= num_slots & -num_slots
+        return count
+
+    def update_count(self, slot, delta):
+        i = slot + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def find_slot(self, position):
+        """Get the slot holding the live key at the input position"""
+        i, remaining = 0, position + 1
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            nxt = i + step
+            if nxt < len(self.tree) and self.tree[nxt] < remaining:
+                i = nxt
+                remaining -= self.tree[nxt]
+            step >>= 1
+        # i is the 1-based slot before the target
+        return i
+
+    def index(self, key):
+        """Position of the key in the store"""
+        try:
+            slot = self.slot_of[key]
+        except KeyError:
+            raise ValueError("{} is not in the store".format(key))
+        return self.prefix_count(slot + 1) - 1
+
+    def append(self, key):
+        if key in self.slot_of:
+            raise ValueError("{} already in the store".format(key))
+        self.slots.append(key)
+        self.slot_of[key] = len(self.slots) - 1
+        # the new node covers the slot range (i - lowbit(i), i]
+        i = len(self.slots)
+        self.tree.append(1 + self.prefix_count(i - 1) - self.prefix_count(i - (i & -i)))
+
+    def remove(self, key):
+        try:
+            slot = self.slot_of.pop(key)
+        except KeyError:
+            raise ValueError("{} is not in the store".format(key))
+        self.slots[slot] = None
+        self.update_count(slot, -1)
+        if len(self.slots) - len(self.slot_of) > self.max_removed_ratio * len(self.slots):
+            self.compact()
+
+    def replace(self, old_key, new_key):
+        """Replace a key in place, keeping its position"""
+        if old_key == new_key:
+            return
+        if new_key in self.slot_of:
+            raise ValueError("{} already in the store".format(new_key))
+        slot = self.slot_of.pop(old_key)
+        self.slots[slot] = new_key
+        self.slot_of[new_key] = slot
+
+    def compact(self):
+        """Drop removed slots and rebuild the tree in linear time"""
+        keys = list(self)
+        self.slots = keys
+        self.slot_of = {key: i for (i, key) in enumerate(keys)}
+        self.tree = [0] + [1] * len(keys)
+        for i in range(1, len(self.tree)):
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
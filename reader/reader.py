@@ -4,20 +4,28 @@ import os
 import re
 import time
 from collections import OrderedDict
-from os.path import basename, exists, join
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from os.path import basename, exists, getsize, join
 
 import bibtexparser
 from bibtexparser import customization
+from bibtexparser.bibdatabase import BibDatabase
 from bibtexparser.bparser import BibTexParser
 
 import utils
 from visual.instantiator import setup
 from writer import Writer
 from reader.rules import *
+from reader.bibtex_stream import RecordParser, is_entry_record, iter_records, parse_records
+from reader.collection_cache import CollectionCache
 from reader.entry_collection import EntryCollection
 from reader.entry import Entry
 
 class Reader:
+    # parallel reading splits files to about that many chunks per process
+    chunks_per_process = 4
+    min_chunk_size = 1 << 16
 
     def __init__(self, conf=None):
         """Constructor"""
@@ -36,6 +44,7 @@ class Reader:
         self.tags_path = os.path.splitext(self.bib_path)[0] + ".tags.json"
         self.temp_dir = self.conf.get_tmp_dir()
         os.makedirs(self.temp_dir, exist_ok=True)
+        self.collection_cache = CollectionCache(join(self.conf.get_config_file_dir(), "cache"), self.visual)
 
         self.setup_entry_fix_rules()
 
@@ -95,12 +104,15 @@ class Reader:
             return preprocessed_path
         return bib_path
 
-    def load_collection(self, db):
+    def load_tags(self):
         if os.path.exists(self.tags_path):
             with open(self.tags_path) as f:
                 self.tags_info = json.load(f)
         else:
             self.tags_info = {"keep":[],"map":{}}
+
+    def load_collection(self, db):
+        self.load_tags()
         db = EntryCollection(db, self.tags_info)
         self.apply_fix_rules(db)
         return db
@@ -169,15 +181,17 @@ class Reader:
 
     # Read a collection of entries
     def read_entry_list(self, elist):
-        if type(elist[0]) in (dict, OrderedDict):
-            entries = {}
-            for el in elist:
+        # lists may mix field dicts and raw bibtex strings, e.g. from multiple getters
+        entries = {}
+        strings = [el for el in elist if type(el) is str]
+        if strings:
+            self.read_string("\n".join(strings))
+            entries.update(self.entry_collection.entries)
+        for el in elist:
+            if type(el) in (dict, OrderedDict):
                 ent = Entry.from_dict(el)
                 entries[ent.ID] = ent
-            return entries
-        elif type(elist[0]) is str:
-            self.read_string("\n".join(elist))
-            return self.entry_collection.entries
+        return entries
 
     # Read from string
     def read_string(self, string):
@@ -189,22 +203,125 @@ class Reader:
         self.visual.log("Loaded {} entries from supplied string.".format(len(db.entries)))
         self.entry_collection = self.load_collection(db)
 
+    def stream_records(self, input_file):
+        """Yield customized entry records one by one, while scanning the file"""
+        self.record_parser = RecordParser(Reader.customizations)
+        for start, _, text in iter_records(input_file):
+            try:
+                records = self.record_parser.parse(text, start)
+            except ValueError as ex:
+                self.visual.fatal_error("Failed to read {}: {}".format(input_file, ex))
+            for record in records:
+                yield record
+
+    def stream_entries(self, input_file=None):
+        """Yield entries one by one, while scanning the file"""
+        if input_file is None:
+            input_file = self.bib_path
+        for record in self.stream_records(input_file):
+            yield Entry(record)
+
+    def stream_collection(self, input_file):
+        """Build the entry collection in a single streaming pass, adding entries as they are read
+
+        The first page of entries of the library is previewed as soon as it is read.
+        """
+        self.load_tags()
+        collection = EntryCollection(BibDatabase(), self.tags_info)
+        num_preview = self.conf.get_list_result_size() if self.reading_library else None
+        ids, preview = [], []
+        for ent in self.stream_entries(input_file):
+            ids.append(ent.ID)
+            ent = collection.add_entry_to_collection_containers(ent)
+            if num_preview and ent is not None and len(preview) < num_preview:
+                preview.append(ent)
+                if len(preview) == num_preview:
+                    self.visual.preview_entries(preview, collection)
+            if len(ids) % 1000 == 0:
+                self.visual.log("Streamed {} entries from file {}...".format(len(ids), input_file))
+        collection.check_duplicates(ids)
+        # strings and preambles of the file, kept for writing
+        collection.bibtex_db = self.record_parser.get_database()
+        return collection
+
+    def parallel_database(self, input_file):
+        """Read a bibtex database by parsing chunks of whole records in a process pool"""
+        num_processes = os.cpu_count() or 1
+        chunk_size = max(self.min_chunk_size, getsize(input_file) // (num_processes * self.chunks_per_process))
+        macros, chunks, chunk, current_size = [], [], [], 0
+        for start, _, text in iter_records(input_file):
+            if not is_entry_record(text):
+                macros.append(text)
+                continue
+            chunk.append((start, text))
+            current_size += len(text)
+            if current_size >= chunk_size:
+                chunks.append(chunk)
+                chunk, current_size = [], 0
+        if chunk:
+            chunks.append(chunk)
+        macros = "".join(macros)
+        self.visual.log("Parsing {} chunks of file {} with {} processes.".format(len(chunks), input_file, num_processes))
+        with ProcessPoolExecutor(num_processes) as pool:
+            # results are merged in file order
+            chunk_entries = pool.map(parse_records, chunks, repeat(Reader.customizations), repeat(macros))
+            try:
+                entries = [record for records in chunk_entries for record in records]
+            except ValueError as ex:
+                self.visual.fatal_error("Failed to read {}: {}".format(input_file, ex))
+        # keep strings and preambles in the database for writing
+        parser = RecordParser()
+        parser.parse(macros, num_entries=0)
+        db = parser.get_database()
+        db.entries = entries
+        return db
+
+    def read_cached(self):
+        """Load the library collection from the cache, if it matches the bib file"""
+        self.load_tags()
+        state = self.collection_cache.load(self.bib_path, self.tags_info)
+        if state is None:
+            return False
+        self.entry_collection = EntryCollection.from_state(state)
+        self.entry_collection.set_source(self.bib_path)
+        self.db = self.entry_collection.bibtex_db
+        self.visual.log("Loaded {} cached entries for file {}.".format(len(self.entry_collection.entries), self.bib_path))
+        return True
+
     # Read bibtex file, preprocessing out comments
     def read(self, input_file=None):
-        if input_file is None:
-            input_file = self.preprocess(self.bib_path)
+        read_mode = self.conf.get_read_mode()
+        self.reading_library = input_file is None
+        if self.reading_library:
+            if self.read_cached():
+                return
+            input_file = self.bib_path
+            if read_mode == "default":
+                input_file = self.preprocess(self.bib_path)
         self.visual.log("Reading from file {}.".format(input_file))
         if not exists(input_file):
             self.visual.error("File {} does not exist.".format(input_file))
             exit(1)
+        source_path = self.bib_path if self.reading_library else input_file
         # read it
-        with open(input_file) as f:
-            parser = BibTexParser()
-            parser.customization = Reader.customizations
-            db = bibtexparser.load(f, parser=parser)
-            self.visual.log("Loaded {} entries from file {}.".format(len(db.entries), self.bib_path))
-        self.db = db
-        self.entry_collection = self.load_collection(db)
+        if read_mode == "stream":
+            # comments are skipped while streaming
+            self.entry_collection = self.stream_collection(input_file)
+            self.visual.log("Loaded {} entries from file {}.".format(len(self.entry_collection.entries), source_path))
+            self.apply_fix_rules(self.entry_collection)
+        else:
+            if read_mode == "parallel":
+                # duplicate ids across chunks are caught by the collection, as in the other modes
+                db = self.parallel_database(input_file)
+            else:
+                with open(input_file) as f:
+                    parser = BibTexParser()
+                    parser.customization = Reader.customizations
+                    db = bibtexparser.load(f, parser=parser)
+            self.visual.log("Loaded {} entries from file {}.".format(len(db.entries), source_path))
+            self.entry_collection = self.load_collection(db)
+        self.db = self.entry_collection.bibtex_db
+        self.entry_collection.set_source(source_path)
 
         updated_tags = self.entry_collection.get_tag_information()
         if updated_tags != self.tags_info:
@@ -219,6 +336,10 @@ class Reader:
                 self.entry_collection.overwrite_file(self.conf)
                 self.entry_collection.reset_modified()
 
+        # cache the library, if it is consistent with the file contents
+        if self.reading_library and not self.entry_collection.modified_collection:
+            self.collection_cache.store(self.entry_collection.get_state(), self.bib_path, self.tags_info)
+
     def get_entry_collection(self):
         return self.entry_collection
 
@@ -0,0 +1,44 @@
+"""Module for entry ids presorted by a column"""
+from bisect import bisect_left, insort
+from itertools import groupby
+from operator import itemgetter
+
+
+class SortedView:
+    """Lowercase entry ids sorted by the listed value of a column"""
+    def __init__(self, column, entries):
+        self.column = column
+        # (sort key, id) pairs in sorted order, with the id only keeping equal keys searchable
+        self.pairs = sorted((self.sort_key(ent), ID) for (ID, ent) in entries.items())
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def sort_key(self, ent):
+        return ent.get_value(self.column, postproc=True)
+
+    def add(self, ID, ent):
+        insort(self.pairs, (self.sort_key(ent), ID))
+
+    def remove(self, ID, ent):
+        pair = (self.sort_key(ent), ID)
+        i = bisect_left(self.pairs, pair)
+        if i < len(self.pairs) and self.pairs[i] == pair:
+            del self.pairs[i]
+            return
+        # the entry was modified in place since it was added
+        for i, (_, other) in enumerate(self.pairs):
+            if other == ID:
+                del self.pairs[i]
+                return
+
+    def order(self, ids):
+        """Sort the input ids by the view, keeping the input order among equal keys as a stable sort would"""
+        positions = {ID: i for (i, ID) in enumerate(ids)}
+        result = []
+        for _, group in groupby((pair for pair in self.pairs if pair[1] in positions), key=itemgetter(0)):
+            group = [ID for (_, ID) in group]
+            if len(group) > 1:
+                group.sort(key=positions.__getitem__)
+            result.extend(group)
+        return result
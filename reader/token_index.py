@@ -0,0 +1,85 @@
+"""Module for an inverted token index over entry fields"""
+import re
+from bisect import bisect_left, insort
+
+token_regex = re.compile(r"[^\W_]+")
+
+
+def tokenize(value):
+    """Get the lowercase alphanumeric tokens of a string or list of strings"""
+    if value is None:
+        return []
+    if not isinstance(value, str):
+        value = " ".join(v for v in value if isinstance(v, str))
+    return token_regex.findall(value.lower())
+
+
+class TokenIndex:
+    """Inverted index of field tokens to lowercase entry ids
+
+    Terms are also kept sorted, so that prefix lookups are a range of the term list.
+    """
+    fields = ("ID", "title", "author", "keywords")
+
+    def __init__(self):
+        # token to the set of ids containing it
+        self.postings = {}
+        # sorted tokens
+        self.terms = []
+
+    def __len__(self):
+        return len(self.terms)
+
+    def entry_tokens(self, ent):
+        tokens = set()
+        for field in self.fields:
+            value = ent.get_field(field)
+            if field == "author" and isinstance(value, str):
+                # unsplit author lists
+                value = value.split(" and ")
+            tokens.update(tokenize(value))
+        return tokens
+
+    def add(self, ID, ent):
+        for token in self.entry_tokens(ent):
+            if token not in self.postings:
+                self.postings[token] = set()
+                insort(self.terms, token)
+            self.postings[token].add(ID)
+
+    def remove(self, ID, ent):
+        for token in self.entry_tokens(ent):
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(ID)
+            if not ids:
+                del self.postings[token]
+                del self.terms[bisect_left(self.terms, token)]
+
+    def prefix_terms(self, prefix):
+        """Get the indexed tokens starting with the prefix"""
+        start = bisect_left(self.terms, prefix)
+        end = start
+        while end < len(self.terms) and self.terms[end].startswith(prefix):
+            end += 1
+        return self.terms[start:end]
+
+    def lookup(self, token, prefix=False):
+        """Get the ids containing the token, or a token it prefixes"""
+        if not prefix:
+            return set(self.postings.get(token, ()))
+        ids = set()
+        for term in self.prefix_terms(token):
+            ids.update(self.postings[term])
+        return ids
+
+    def match(self, query, prefix=True):
+        """Get the ids containing all tokens of the query, as prefixes by default, or None for queries without tokens"""
+        result = None
+        # rarest tokens first, to keep intersections small
+        for ids in sorted((self.lookup(token, prefix) for token in set(tokenize(query))), key=len):
+            result = ids if result is None else result & ids
+            if not result:
+                break
+        return result
@@ -1,5 +1,5 @@
 from collections import namedtuple
-from thread.threaded import TimedThreadRunner
+from thread.threaded import DebouncedExecutor
 
 import clipboard
 
@@ -14,6 +14,8 @@ from writer import Writer
 from reader.entry import Entry
 from search.searcher_factory import create_searcher
 from selection import Selector
+from reader.filter_engine import FilterEngine
+from visual.filterer import operators
 from visual.instantiator import setup
 
 
@@ -31,6 +33,7 @@ class Runner:
         self.getter = None
         self.editor = None
         self.sorter = None
+        self.filter_engine = None
 
         # read the bib database
         if entry_collection is None:
@@ -186,9 +189,27 @@ class Runner:
         # deselect
         self.selector.clear_cached()
 
+    def get_filter_engine(self):
+        """singleton filter engine fetcher"""
+        if self.filter_engine is None:
+            self.filter_engine = FilterEngine(self.entry_collection)
+        return self.filter_engine
+
     def apply_filter(self, filter_arg):
         """Apply a listing filter"""
-        filtered_entries = self.visual.apply_filter(filter_arg, self.get_current_entries())
+        idxs = self.selector.get_selection(default_to_reference=True)
+        if self.reference_entry_id_list is self.entry_collection.id_list and len(idxs) == len(self.reference_entry_id_list):
+            # filter the whole collection
+            ids = None
+        else:
+            ids = [self.reference_entry_id_list[i] for i in idxs]
+        try:
+            filtered_ids = self.get_filter_engine().apply(filter_arg, ids)
+        except ValueError as ex:
+            self.visual.error(f"{ex}")
+            self.visual.error(f"Available filters: {list(operators.keys())} entry keys: {self.visual.filtering_keys}")
+            return
+        filtered_entries = [self.entry_collection.entries[ID] for ID in filtered_ids]
         # idxs = self.selector.select_by_objects(filtered_entries, yield_ones_index=True)
         self.visual.print_entries_enum(filtered_entries, None)
         # self.list(idxs)
@@ -220,14 +241,18 @@ class Runner:
         self.is_running = False
 
     def search_for_entry(self, query):
-        searcher = self.get_searcher()
-        searcher.prepare(self.entry_collection.get_searchable_format(), self.config.get_config_file_dir(), self.get_max_search(), self.searchable_fields)
-        breakpoint()
-        results_ids = searcher.search(query)
-
-        self.visual.print_entries_enum([self.entry_collection.entries[ID] for ID in results_ids], self.entry_collection, do_sort=False)
+        results_ids = self.get_searcher().search(query)
+        self.show_search_results(query, results_ids)
         return results_ids
 
+    def search_for_entry_cancellable(self, query, is_cancelled):
+        return self.get_searcher().search(query, is_cancelled)
+
+    def show_search_results(self, query, results_ids):
+        # may run in the search worker, while the main thread reads input
+        with self.visual.exclusive_access():
+            self.visual.print_entries_enum([self.entry_collection.entries[ID] for ID in results_ids], self.entry_collection, do_sort=False)
+
 
     def get_bibtex(self, arg=None):
         """Function to fetch a bibtex"""
@@ -328,53 +353,72 @@ class Runner:
         """
 
         self.visual.log("Starting search")
+        # entries changed in place since the last search are reindexed at once
+        self.get_searcher()
+        self.entry_collection.update_searcher()
         if self.search_invoke_counter > 0:
             # step to the starting history to search everything
             self.reset_history()
-        search_done = False
-        just_began_search = True
         query_supplied = bool(query)
 
-        ttr = TimedThreadRunner(self.search_for_entry, "")
-        # ttr.set_delay(1, self.visual.log, "delaying search execution...")
-
-        while True:
-            # get new search object, if it's a continued search OR no pre-given query
-            if not just_began_search or (just_began_search and not query_supplied):
-                search_done, new_query = self.visual.receive_search()
-                self.visual.log("Got: [{}] [{}]".format(search_done, new_query))
+        if not self.visual.does_incremental_search:
+            if not query_supplied:
+                search_done, query = self.visual.receive_search()
                 if search_done is None:
-                    # pressed ESC
                     self.visual.message("Aborting search")
                     return
-                if new_query == "" and search_done:
-                    # pressed enter
-                    self.visual.message("Concluded search")
-                    break
-                # got an actual query item
-                # if query content is updated, reset the timer
-                query = new_query
-
             query = query.lower().strip()
-            # ttr.reset_time(query)
-            # self.visual.log("Got query: {}".format(query))
-            # ttr.update_args(query)
-            # ttr.start()
-            # ttr.stop()
-            # results_ids = ttr.get_result()
             results_ids = self.search_for_entry(query)
-            # results_ids = []
-            just_began_search = False
             self.search_invoke_counter += 1
-            if not self.visual.does_incremental_search:
-                break
+        else:
+            concluded = self.search_incrementally(query if query_supplied else None)
+            if concluded is None:
+                return
+            query, results_ids = concluded
 
-        if not query:
+        if not query or results_ids is None:
             # no search was performed
             return
         # push the reflist modification to history
         self.change_history(results_ids, "search:\"{}\"".format(query))
 
+    def search_incrementally(self, query=None):
+        """Search on each keystroke, on a worker that runs the latest query once typing pauses
+
+        Returns the concluded query and its results, None results if the search failed, or None if aborted.
+        """
+        executor = DebouncedExecutor(self.search_for_entry_cancellable, self.visual.search_time_delta,
+                                     on_result=self.show_search_results, name="search")
+        try:
+            if query:
+                query = query.lower().strip()
+                executor.submit(query)
+                self.search_invoke_counter += 1
+            while True:
+                search_done, new_query = self.visual.receive_search()
+                self.visual.log("Got: [{}] [{}]".format(search_done, new_query))
+                if search_done is None:
+                    # pressed ESC
+                    self.visual.message("Aborting search")
+                    return None
+                if new_query == "" and search_done:
+                    # pressed enter
+                    self.visual.message("Concluded search")
+                    break
+                # got an actual query item, superseding any pending search
+                query = new_query.lower().strip()
+                executor.submit(query)
+                self.search_invoke_counter += 1
+            # the results of the latest query, run right away if still pending
+            try:
+                results_ids = executor.flush()
+            except Exception as ex:
+                self.visual.error("Search for [{}] failed: {}".format(query, ex))
+                results_ids = None
+        finally:
+            executor.stop()
+        return query, results_ids
+
     # print entry, only fields of interest
     def show_entries(self, inp=None):
         """Print contents of the entries in the input"""
@@ -400,6 +444,12 @@ class Runner:
     def get_searcher(self):
         if self.searcher is None:
             self.searcher = create_searcher(self.config.get_searcher())
+            self.searcher.set_prefilter_overlap(self.config.get_search_prefilter_overlap())
+            # unsaved collections cannot be matched to a persisted index
+            source_path = None if self.modified_collection() else self.entry_collection.source_path
+            self.searcher.prepare(self.entry_collection.get_searchable_format(), self.config.get_config_file_dir(), self.get_max_search(), self.searchable_fields, source_path=source_path)
+            # keep the searcher updated with collection changes
+            self.entry_collection.attach_searcher(self.searcher)
         return self.searcher
 
     def get_editor(self):
@@ -545,6 +595,8 @@ class Runner:
         # write
         self.entry_collection.overwrite_file(self.config)
         self.entry_collection.reset_modified()
+        if self.searcher is not None:
+            self.searcher.sync_source(self.config.get_user_setting("bib_path"))
 
 
     def set_local_pdf_path(self, str_selection=None):
@@ -573,7 +625,8 @@ class Runner:
         for entry_id in to_delete:
             self.entry_collection.remove(entry_id)
             self.visual.log("Deleted entry {}".format(entry_id))
-        remaining = [x for x in self.reference_entry_id_list if x not in to_delete]
+        deleted = set(to_delete)
+        remaining = [x for x in self.reference_entry_id_list if x not in deleted]
         self.visual.log("Deleted {}/{} entries, left with {}".format(del_len, old_len, len(remaining)))
         self.push_reference_list(remaining, "deletion", force=True)
         self.unselect()
@@ -602,48 +655,62 @@ class Runner:
         self.visual.message("Copied to clipboard: {}".format(citation_id))
 
 
-    def get_pdf_from_web(self, str_selection=None):
+    def select_pdf_download_entries(self, str_selection):
+        """Select entries to download pdfs to, confirming the replacement of existing ones"""
         nums = self.selector.select_by_index(str_selection)
-        if nums is None or not nums or len(nums) > 1:
-            self.visual.error("Need a single selection to download pdf to.")
-            return
-        entry_id = self.reference_entry_id_list[nums[0]]
-        entry = self.entry_collection.entries[entry_id]
-        if entry.file is not None:
-            if not self.visual.yes_no("Pdf attribute exists: {}, replace?".format(entry.file), default_yes=False):
-                return
-        getter = Getter(self.config)
-        pdf_url = self.visual.ask_user("Give pdf url to download", multichar=True)
-        if pdf_url is None:
+        if nums is None or not nums:
+            self.visual.error("Need a selection to download pdfs to.")
+            return []
+        entries = []
+        for num in nums:
+            entry = self.entry_collection.entries[self.reference_entry_id_list[num]]
+            if entry.file is not None:
+                if not self.visual.yes_no("Pdf attribute of {} exists: {}, replace?".format(entry.ID, entry.file), default_yes=False):
+                    continue
+            entries.append(entry)
+        return entries
+
+    def set_downloaded_pdf(self, entry_id, file_path):
+        """Attach a completed download to its entry"""
+        entry = self.entry_collection.get_entry(entry_id)
+        editor = self.get_editor()
+        if file_path != editor.get_entry_canonic_pdf_path(entry):
+            # an identical file downloaded for another entry, or a download kept next to a different existing file
+            entry.set_file(file_path)
+            updated_entry = entry
+        else:
+            updated_entry = editor.set_file(entry, file_path=file_path)
+        if updated_entry is not None:
+            self.entry_collection.replace(updated_entry)
+
+    def report_pdf_downloads(self, result):
+        if result is None:
             return
-        file_path = getter.download_web_pdf(pdf_url, entry_id)
-        if file_path is None:
-            self.visual.error("Failed to download from {}.".format(pdf_url))
+        failed, duplicates = result
+        if failed:
+            self.visual.error("Failed to download {} pdf(s): {}".format(len(failed), failed))
+        if duplicates:
+            self.visual.message("Assigned existing identical files to {} downloaded pdf(s): {}".format(len(duplicates), duplicates))
+
+    def get_pdf_from_web(self, str_selection=None):
+        entries = self.select_pdf_download_entries(str_selection)
+        urls = {}
+        for entry in entries:
+            pdf_url = self.visual.ask_user("Give pdf url to download for {}".format(entry.ID), multichar=True)
+            if pdf_url:
+                urls[entry.ID] = pdf_url
+        if not urls:
             return
-        updated_entry = self.get_editor().set_file(entry, file_path=file_path)
-        self.entry_collection.replace(updated_entry)
+        self.report_pdf_downloads(self.get_getter().download_web_pdfs(urls, self.set_downloaded_pdf))
 
     def search_web_pdf(self, str_selection=None):
-        """Search the web for a pdf pertaining to the current entry selection
+        """Search the web for pdfs pertaining to the current entry selection
         """
-
-        nums = self.selector.select_by_index(str_selection)
-        if nums is None or not nums or len(nums) > 1:
-            self.visual.error("Need a single selection to download pdf to.")
-            return
-        entry_id = self.reference_entry_id_list[nums[0]]
-        entry = self.entry_collection.entries[entry_id]
-        if entry.file is not None:
-            if not self.visual.yes_no("Pdf attribute exists: {}, replace?".format(entry.file), default_yes=False):
-                return
-        pdf_path = self.get_getter().search_web_pdf(entry_id, self.get_searcher().preprocess_query(entry.title), entry.year)
-        if pdf_path is None:
-            self.visual.log("Invalid pdf path, aborting.")
-            return
-        updated_entry = self.get_editor().set_file(entry, file_path=pdf_path)
-        if updated_entry is None:
+        entries = self.select_pdf_download_entries(str_selection)
+        if not entries:
             return
-        self.entry_collection.replace(updated_entry)
+        queries = {entry.ID: (self.get_searcher().preprocess_query(entry.title), entry.year) for entry in entries}
+        self.report_pdf_downloads(self.get_getter().search_web_pdfs(queries, self.set_downloaded_pdf))
 
     def loop(self, input_cmd=None):
         """Runner execution loop
@@ -662,3 +729,5 @@ class Runner:
         # end of loop
         self.save_if_modified(called_explicitely=False)
         self.config.save_if_modified()
+        if self.searcher is not None:
+            self.searcher.close()
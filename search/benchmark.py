@@ -0,0 +1,86 @@
+"""Benchmark of the fuzzy search n-gram prefilter against exhaustive scoring
+
+Usage: python -m search.benchmark <bib file> [--overlaps 0.2 0.4] [--num-queries 50] [--top 10]
+"""
+import argparse
+import random
+import time
+
+import bibtexparser
+from bibtexparser.bparser import BibTexParser
+
+from reader.entry import Entry
+from reader.reader import Reader
+from search.fuzzy_searcher import FuzzySearcher
+
+searchable_fields = ["ID", "title", "author", "keywords"]
+
+
+def load_data(path):
+    with open(path) as f:
+        parser = BibTexParser()
+        parser.customization = Reader.customizations
+        db = bibtexparser.load(f, parser=parser)
+    return {ent.ID: ent.raw_dict for ent in map(Entry, db.entries)}
+
+
+def sample_queries(data, num_queries, seed=0):
+    """Sample title fragments of a few words, with a typo in half of them"""
+    rng = random.Random(seed)
+    titles = [d["title"] for d in data.values() if d.get("title")]
+    queries = []
+    for _ in range(num_queries):
+        words = rng.choice(titles).lower().split()
+        start = rng.randrange(len(words))
+        query = " ".join(words[start:start + rng.randint(1, 3)])
+        if len(query) > 3 and rng.random() < 0.5:
+            i = rng.randrange(len(query))
+            query = query[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + query[i + 1:]
+        queries.append(query)
+    return queries
+
+
+def recall(results, base_results, top=None):
+    """Fraction of the (top) exhaustive results also returned by the prefiltered search"""
+    found = sum(len(set(res) & set(base[:top])) for (res, base) in zip(results, base_results))
+    total = sum(len(base[:top]) for base in base_results)
+    return found / total if total else 1.0
+
+
+def run(data, queries, overlap):
+    """Get the total search time and the results per query"""
+    searcher = FuzzySearcher()
+    searcher.prepare(data, None, None, searchable_fields)
+    searcher.set_prefilter_overlap(overlap)
+    # build the candidates and gram postings outside of the timing
+    searcher.search(queries[0])
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        # no reuse of previous query scores
+        searcher.session = None
+        results.append(searcher.search(query))
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the prefiltered fuzzy search to exhaustive scoring")
+    parser.add_argument("bib_path")
+    parser.add_argument("--overlaps", nargs="+", type=float, default=[0.2, 0.3, 0.5])
+    parser.add_argument("--num-queries", type=int, default=50)
+    parser.add_argument("--top", type=int, default=10, help="number of best exhaustive results to also measure recall on")
+    args = parser.parse_args()
+
+    data = load_data(args.bib_path)
+    queries = sample_queries(data, args.num_queries)
+    print("{} entries, {} queries".format(len(data), len(queries)))
+    base_time, base_results = run(data, queries, 0)
+    print("exhaustive: {:.3f} s".format(base_time))
+    for overlap in args.overlaps:
+        elapsed, results = run(data, queries, overlap)
+        print("overlap {}: {:.3f} s, speedup {:.2f}x, recall {:.4f}, top-{} recall {:.4f}".format(
+            overlap, elapsed, base_time / elapsed, recall(results, base_results), args.top, recall(results, base_results, args.top)))
+
+
+if __name__ == "__main__":
+    main()
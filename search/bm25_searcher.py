@@ -0,0 +1,225 @@
+import heapq
+import math
+from array import array
+from bisect import bisect_left
+
+from reader.token_index import tokenize
+from search.searcher import Searcher
+
+
+def within_edit_distance(a, b, max_distance):
+    """Check whether two strings are within an edit distance, with a banded dynamic program"""
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+        if min(current) > max_distance:
+            return False
+        previous = current
+    return previous[-1] <= max_distance
+
+
+def deletions(term):
+    """Get the strings resulting from deleting a single character of a term"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class Postings:
+    """Document numbers and weighted term frequencies of a term, in increasing document order"""
+    __slots__ = ("docs", "freqs")
+
+    def __init__(self):
+        self.docs = array("I")
+        self.freqs = array("f")
+
+
+class BM25Searcher(Searcher):
+    """In-memory BM25F ranking over tokenized entry fields
+
+    Field occurrences are weighted into a single term frequency per entry. Query terms missing from the
+    vocabulary are expanded to terms within a single edit, and the last query term also to the terms it prefixes.
+    """
+    name = "bm25"
+    field_weights = {"ID": 1.0, "title": 1.0, "author": 1.5, "keywords": 1.2}
+    k1 = 1.2
+    b = 0.75
+    # score factors of expanded query terms
+    prefix_weight = 0.8
+    typo_weight = 0.5
+    # minimum length of terms expanded by edits, and maximum expansions per query term
+    min_typo_length = 4
+    max_expansions = 50
+    # compact the postings once removed entries exceed that fraction of all documents
+    max_removed_ratio = 0.5
+
+    def prepare(self, data_dict, config_dir, max_search_num, searchable_fields=None, source_path=None):
+        self.max_search_num = max_search_num
+        fields = searchable_fields if searchable_fields is not None else list(self.field_weights)
+        self.weights = {f: self.field_weights.get(f, 1.0) for f in fields}
+        self.build(data_dict.values())
+
+    def build(self, entry_dicts):
+        # term to postings
+        self.postings = {}
+        # term to number of live documents containing it
+        self.doc_freqs = {}
+        # sorted terms, for prefix expansion
+        self.terms = []
+        # single-deletion variants to terms, built on the first edit expansion
+        self.deletion_index = None
+        # per document: entry id (None once removed), weighted length and distinct terms
+        self.doc_ids = []
+        self.doc_lengths = array("f")
+        self.doc_terms = []
+        self.doc_of = {}
+        self.total_length = 0.0
+        for entry_dict in entry_dicts:
+            self.add_document(entry_dict)
+        self.terms = sorted(self.postings)
+
+    def entry_term_freqs(self, entry_dict):
+        """Get the weighted term frequencies and total weighted length of an entry"""
+        freqs, length = {}, 0.0
+        for field, weight in self.weights.items():
+            value = entry_dict.get(field)
+            if field == "author" and isinstance(value, str):
+                value = value.split(" and ")
+            for token in tokenize(value):
+                freqs[token] = freqs.get(token, 0.0) + weight
+                length += weight
+        return freqs, length
+
+    def add_document(self, entry_dict):
+        """Add an entry as a new document, returning the newly seen terms"""
+        freqs, length = self.entry_term_freqs(entry_dict)
+        doc = len(self.doc_ids)
+        self.doc_ids.append(entry_dict["ID"])
+        self.doc_of[entry_dict["ID"]] = doc
+        self.doc_lengths.append(length)
+        self.doc_terms.append(tuple(freqs))
+        self.total_length += length
+        new_terms = []
+        for term, freq in freqs.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = Postings()
+                self.doc_freqs[term] = 0
+                new_terms.append(term)
+            postings.docs.append(doc)
+            postings.freqs.append(freq)
+            self.doc_freqs[term] += 1
+        return new_terms
+
+    def num_docs(self):
+        return len(self.doc_of)
+
+    def update_add(self, entry_dict):
+        if entry_dict["ID"] in self.doc_of:
+            self.update_remove(entry_dict["ID"])
+        for term in self.add_document(entry_dict):
+            self.terms.insert(bisect_left(self.terms, term), term)
+            if self.deletion_index is not None:
+                self.index_deletions(term)
+
+    def update_remove(self, entry_id):
+        doc = self.doc_of.pop(entry_id, None)
+        if doc is None:
+            return
+        # postings of removed documents are skipped while scoring, until compacted
+        self.doc_ids[doc] = None
+        self.total_length -= self.doc_lengths[doc]
+        for term in self.doc_terms[doc]:
+            self.doc_freqs[term] -= 1
+        self.doc_terms[doc] = ()
+        if len(self.doc_ids) - len(self.doc_of) > self.max_removed_ratio * len(self.doc_ids):
+            self.compact()
+
+    def compact(self):
+        """Renumber the live documents, dropping the postings of removed ones"""
+        renumbered = {}
+        for doc, ID in enumerate(self.doc_ids):
+            if ID is not None:
+                renumbered[doc] = len(renumbered)
+        for term in [t for (t, df) in self.doc_freqs.items() if df == 0]:
+            del self.postings[term], self.doc_freqs[term]
+        for postings in self.postings.values():
+            live = [(renumbered[d], f) for (d, f) in zip(postings.docs, postings.freqs) if d in renumbered]
+            postings.docs = array("I", [d for (d, _) in live])
+            postings.freqs = array("f", [f for (_, f) in live])
+        self.doc_ids = [ID for ID in self.doc_ids if ID is not None]
+        self.doc_lengths = array("f", [self.doc_lengths[d] for d in renumbered])
+        self.doc_terms = [self.doc_terms[d] for d in renumbered]
+        self.doc_of = {ID: doc for (doc, ID) in enumerate(self.doc_ids)}
+        self.terms = sorted(self.postings)
+        self.deletion_index = None
+
+    def index_deletions(self, term):
+        if len(term) < self.min_typo_length:
+            return
+        self.deletion_index.setdefault(term, set()).add(term)
+        for variant in deletions(term):
+            self.deletion_index.setdefault(variant, set()).add(term)
+
+    def typo_terms(self, term):
+        """Get the vocabulary terms within a single edit of the term"""
+        if len(term) < self.min_typo_length:
+            return []
+        if self.deletion_index is None:
+            self.deletion_index = {}
+            for t in self.terms:
+                self.index_deletions(t)
+        candidates = set(self.deletion_index.get(term, ()))
+        for variant in deletions(term):
+            candidates.update(self.deletion_index.get(variant, ()))
+        # shared deletions can be two edits apart, e.g. two substitutions of adjacent characters
+        return [t for t in candidates if self.doc_freqs.get(t) and within_edit_distance(term, t, 1)][:self.max_expansions]
+
+    def prefix_terms(self, prefix):
+        start = bisect_left(self.terms, prefix)
+        result = []
+        for term in self.terms[start:]:
+            if not term.startswith(prefix) or len(result) >= self.max_expansions:
+                break
+            if term != prefix and self.doc_freqs.get(term):
+                result.append(term)
+        return result
+
+    def expand(self, term, is_last):
+        """Get the (term, weight) pairs a query term matches"""
+        expanded = []
+        if self.doc_freqs.get(term):
+            expanded.append((term, 1.0))
+        if is_last:
+            expanded.extend((t, self.prefix_weight) for t in self.prefix_terms(term))
+        if not expanded:
+            expanded.extend((t, self.typo_weight) for t in self.typo_terms(term))
+        return expanded
+
+    def search(self, query, is_cancelled=None):
+        tokens = tokenize(query)
+        if not tokens or not self.doc_of:
+            return []
+        num_docs = self.num_docs()
+        avg_length = self.total_length / num_docs or 1.0
+        k1, b = self.k1, self.b
+        scores = {}
+        for i, token in enumerate(tokens):
+            for term, weight in self.expand(token, i == len(tokens) - 1):
+                if is_cancelled is not None and is_cancelled():
+                    return None
+                df = self.doc_freqs[term]
+                idf = weight * math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+                postings = self.postings[term]
+                for doc, freq in zip(postings.docs, postings.freqs):
+                    if self.doc_ids[doc] is None:
+                        continue
+                    norm = k1 * (1 - b + b * self.doc_lengths[doc] / avg_length)
+                    scores[doc] = scores.get(doc, 0.0) + idf * freq * (k1 + 1) / (freq + norm)
+        if self.max_search_num is None:
+            best = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        else:
+            best = heapq.nlargest(self.max_search_num, scores.items(), key=lambda x: x[1])
+        return [self.doc_ids[doc] for (doc, _) in best]
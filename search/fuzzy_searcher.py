@@ -1,8 +1,149 @@
+import heapq
+import math
+import multiprocessing
 import os
-import pickle
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
 from search.searcher import Searcher
 from fuzzywuzzy import fuzz
 
+# per-field candidate values, handed once to each scoring worker process
+worker_candidates = None
+
+
+def init_scoring_worker(candidates):
+    global worker_candidates
+    worker_candidates = candidates
+
+
+def score_candidates(query, values):
+    """Score a query against a batch of candidate values"""
+    return [fuzz.partial_ratio(query, v) for v in values]
+
+
+def score_candidate_chunk(field, start, end, query):
+    """Score a query against a chunk of a field's values, within a worker process"""
+    return score_candidates(query, worker_candidates[field][start:end])
+
+
+def score_candidate_indices(field, indices, query):
+    """Score a query against selected values of a field, within a worker process"""
+    values = worker_candidates[field]
+    return score_candidates(query, [values[i] for i in indices])
+
+
+def value_grams(value, size):
+    """Get the set of character n-grams of a string"""
+    return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+
+class GramIndex:
+    """Character n-gram postings of the values of a field"""
+    def __init__(self, values, size):
+        self.size = size
+        # gram to the indices of the values containing it
+        self.postings = {}
+        # indices of values too short to have grams
+        self.short = []
+        for i, value in enumerate(values):
+            self.add(i, value)
+
+    def add(self, i, value):
+        if len(value) < self.size:
+            self.short.append(i)
+            return
+        for gram in value_grams(value, self.size):
+            self.postings.setdefault(gram, []).append(i)
+
+    def select(self, query, overlap):
+        """Get the indices of the values sharing at least the overlap fraction of the query grams, or None if the query has no grams"""
+        grams = value_grams(query, self.size)
+        if not grams:
+            return None
+        counts = Counter()
+        for gram in grams:
+            counts.update(self.postings.get(gram, ()))
+        needed = math.ceil(overlap * len(grams))
+        return sorted([i for (i, count) in counts.items() if count >= needed] + self.short)
+
+
+class FieldCandidates:
+    """Precomputed searchable values of a single entry field
+
+    Values are only appended, removed candidates keep their values with a None identifier,
+    so that value indices stay valid, e.g. in the scoring worker processes.
+    """
+    def __init__(self):
+        # identifier reported for each candidate, None for removed ones
+        self.ids = []
+        # flattened values, with the index of the candidate each one belongs to
+        self.values = []
+        self.owners = []
+        # lowercase entry id to the indices of its values
+        self.value_indices = {}
+        # n-gram postings of the values, built on demand
+        self.gram_index = None
+        self.num_removed = 0
+
+    def add(self, field, entry_dict, is_multivalue):
+        value = entry_dict.get(field)
+        if value is None or len(value) == 0:
+            return
+        if type(value) == str:
+            value = value.lower()
+        # ID matches are reported by their lowercased value
+        self.ids.append(value if field == "ID" else entry_dict["ID"])
+        values = value if is_multivalue and type(value) == list else [value]
+        self.value_indices[entry_dict["ID"].lower()] = list(range(len(self.values), len(self.values) + len(values)))
+        for value in values:
+            if self.gram_index is not None:
+                self.gram_index.add(len(self.values), value)
+            self.values.append(value)
+            self.owners.append(len(self.ids) - 1)
+
+    def remove(self, entry_id):
+        indices = self.value_indices.pop(entry_id.lower(), None)
+        if indices:
+            self.ids[self.owners[indices[0]]] = None
+            self.num_removed += len(indices)
+
+
+def common_counts(query, values):
+    """Get the number of characters each value shares with the query, counting repeated characters"""
+    counts = Counter(query)
+    return [sum(min(k, value.count(ch)) for (ch, k) in counts.items()) for value in values]
+
+
+class SearchSession:
+    """Characters the last query shares with the field values, to skip values that cannot match queries extending it
+
+    A value sharing c characters with a query scores at most 2c / (n + c), with n the length of the shorter of the two:
+    the matching blocks of any compared window consist of shared characters, and the window is at least as long.
+    Appending characters to the query updates the shared characters with a single count per value.
+    """
+    def __init__(self, query):
+        self.query = query
+        # field to the number of characters each value shares with the query, computed once a query extends it
+        self.common = {}
+
+    def is_extended_by(self, query):
+        return query != self.query and query.startswith(self.query)
+
+    def extend(self, field, query, values):
+        """Get the shared characters of the values with an extending query"""
+        common = self.common.get(field)
+        if common is None:
+            return common_counts(query, values)
+        counts = Counter(self.query)
+        for ch in query[len(self.query):]:
+            # a value shares the appended character if it has more of it than the query so far
+            k = counts[ch]
+            common = [c + (value.count(ch) > k) for (c, value) in zip(common, values)]
+            counts[ch] += 1
+        return common
+
 
 class FuzzySearcher(Searcher):
     name = "fuzzy"
@@ -12,114 +153,189 @@ class FuzzySearcher(Searcher):
         self.stopwords = """i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself yourselves he him his himself she she's her hers herself it it's its itself they them their theirs themselves what which who whom this that that'll these those am is are was were be been being have has had having do does did doing a an the and but if or because as until while of at by for with about against between into through during before after above below to from up down in out on off over under again further then once here there when where why how all any both each few more most other some such no nor not only own same so than too very s t can will just don don't should should've now d ll m o re ve y ain aren aren't couldn couldn't didn didn't doesn doesn't hadn hadn't hasn hasn't haven haven't isn isn't ma mightn mightn't mustn mustn't needn needn't shan shan't shouldn shouldn't wasn wasn't weren weren't won won't wouldn wouldn't""".split()
 
         # search settings
+        # fields with at least that many values are scored in a process pool
+        self.parallel_min_candidates = 20000
+        self.chunk_size = 5000
+        # fraction of the query trigrams a value must contain to be scored, 0 to score all values
+        self.prefilter_overlap = 0
+        self.gram_size = 3
+        self.pool = None
+        # number of values per field the pool workers were handed
+        self.pooled_sizes = {}
+        self.candidates = None
+        self.session = None
 
 
-    def prepare(self, data_dict, config_dir, max_search_num, searchable_fields=None):
+    def prepare(self, data_dict, config_dir, max_search_num, searchable_fields=None, source_path=None):
         self.searchable_fields=searchable_fields
         self.max_search_num = max_search_num
-        self.data = list(data_dict.values())
+        self.data = dict(data_dict)
         self.multivalue_keys = ["author", "keywords"]
+        self.invalidate_candidates()
+
+    def set_prefilter_overlap(self, overlap):
+        self.prefilter_overlap = overlap
+
+    def update_add(self, entry_dict):
+        if entry_dict["ID"] in self.data:
+            self.update_remove(entry_dict["ID"])
+        self.data[entry_dict["ID"]] = entry_dict
+        if self.candidates is not None:
+            for field, fc in self.candidates.items():
+                fc.add(field, entry_dict, self.is_multivalue_key(field))
+        self.session = None
+
+    def update_remove(self, entry_id):
+        self.data.pop(entry_id, None)
+        if self.candidates is not None:
+            for fc in self.candidates.values():
+                fc.remove(entry_id)
+            # compact when removed values dominate
+            if any(fc.num_removed > len(fc.values) // 2 for fc in self.candidates.values()):
+                self.invalidate_candidates()
+        self.session = None
 
     def is_multivalue_key(self, filter_key):
         return filter_key in self.multivalue_keys
 
+    def invalidate_candidates(self):
+        """Drop the precomputed candidates, to be rebuilt on the next search"""
+        self.candidates = None
+        self.session = None
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+    def get_candidates(self):
+        if self.candidates is None:
+            self.build_candidates()
+        return self.candidates
+
+    def build_candidates(self):
+        """Precompute the lowercased candidate values of every searchable field"""
+        self.candidates = {}
+        for field in self.searchable_fields:
+            fc = FieldCandidates()
+            for entry_dict in self.data.values():
+                fc.add(field, entry_dict, self.is_multivalue_key(field))
+            self.candidates[field] = fc
+
+    def get_pool(self):
+        if self.pool is None:
+            values = {field: list(fc.values) for (field, fc) in self.candidates.items()}
+            self.pooled_sizes = {field: len(v) for (field, v) in values.items()}
+            # searches run in worker threads, which must not be forked
+            context = multiprocessing.get_context("spawn")
+            self.pool = ProcessPoolExecutor(os.cpu_count(), mp_context=context, initializer=init_scoring_worker, initargs=(values,))
+        return self.pool
+
+    def score(self, field, query, indices=None):
+        """Score a query against the values of a field, in chunks over the process pool for large fields
+
+        If indices are given, only the values at these ascending indices are scored.
+        Values added after the pool was started are scored in-process.
+        """
+        values = self.candidates[field].values
+        num_scored = len(values) if indices is None else len(indices)
+        if num_scored < self.parallel_min_candidates:
+            return score_candidates(query, values if indices is None else [values[i] for i in indices])
+        pool = self.get_pool()
+        pooled = self.pooled_sizes[field]
+        if indices is None:
+            futures = [pool.submit(score_candidate_chunk, field, start, min(start + self.chunk_size, pooled), query)
+                       for start in range(0, pooled, self.chunk_size)]
+            added = values[pooled:]
+        else:
+            split = bisect_left(indices, pooled)
+            futures = [pool.submit(score_candidate_indices, field, indices[start:min(start + self.chunk_size, split)], query)
+                       for start in range(0, split, self.chunk_size)]
+            added = [values[i] for i in indices[split:]]
+        return [score for fut in futures for score in fut.result()] + score_candidates(query, added)
+
+    def prefilter(self, field, query, indices=None):
+        """Restrict the value indices to score, or all values for None indices, to the ones sharing enough grams with the query"""
+        if not self.prefilter_overlap:
+            return indices
+        fc = self.candidates[field]
+        if fc.gram_index is None:
+            fc.gram_index = GramIndex(fc.values, self.gram_size)
+        selected = fc.gram_index.select(query, self.prefilter_overlap)
+        if selected is None:
+            return indices
+        if indices is not None:
+            selected_set = set(selected)
+            selected = [i for i in indices if i in selected_set]
+        return selected
+
+    def top_matches(self, matches, key=lambda x: x[1]):
+        """Get the best-scoring matches, keeping the input order on ties"""
+        if self.max_search_num is None:
+            return sorted(matches, key=key, reverse=True)
+        return heapq.nlargest(self.max_search_num, matches, key=key)
 
     def preprocess_query(self, query):
         query = query.lower()
         query = " ".join([q for q in query.split() if q not in self.stopwords])
         return query
 
-    def fuzzy_search(self, query, candidates, iterable_items=False):
+    def fuzzy_search(self, query, candidates):
+        """Search an arbitrary list of candidate strings, yielding ((candidate, score), index) results"""
         query = self.preprocess_query(query)
-        if iterable_items:
-            # flatten
-            nums = list(map(len, candidates))
-            flattened_candidates = [c for clist in candidates for c in clist]
-            # score
-            raw_results = [(c, fuzz.partial_ratio(query, c)) for c in flattened_candidates]
-            # argmax
-            results, curr_idx = [], 0
-            for n in nums:
-                if n > 1:
-                    max_val = max(raw_results[curr_idx: curr_idx + n], key=lambda x: x[1])
-                else:
-                    max_val = raw_results[curr_idx]
-                results.append(max_val)
-                # print("Got from: {} : {}".format(raw_results[curr_idx: curr_idx + n], max_val))
-                curr_idx += n
-        else:
-            results = [(c, fuzz.partial_ratio(query, c)) for c in candidates]
-        # assign index
-        results = [(results[i], i) for i in range(len(results)) if results[i][1] >= self.fuzzy_score_match_threshold]
-        results = sorted(results, key=lambda x: x[0][1], reverse=True)
-        return results[:self.max_search_num]
+        scores = score_candidates(query, candidates)
+        results = [((candidates[i], scores[i]), i) for i in range(len(candidates)) if scores[i] >= self.fuzzy_score_match_threshold]
+        return self.top_matches(results, key=lambda x: x[0][1])
 
+    def rank_field(self, field, query, session=None, previous=None):
+        """Get the best (id, score) matches of a preprocessed query in a field
 
-    def search(self, query):
+        When the query extends the previous session, values sharing too few characters with it to reach the threshold
+        are not scored, and the shared characters are recorded in the session. Values failing the n-gram prefilter are not scored either.
+        """
+        fc = self.candidates[field]
+        eligible = None
+        if previous is not None:
+            common = previous.extend(field, query, fc.values)
+            if session is not None:
+                session.common[field] = common
+            # scores are rounded, so values within half a point of the threshold still qualify
+            threshold = self.fuzzy_score_match_threshold - 0.5
+            eligible = [i for (i, (c, value)) in enumerate(zip(common, fc.values))
+                        if 200 * c >= threshold * (min(len(query), len(value)) + c)]
+        indices = self.prefilter(field, query, eligible)
+        scores = self.score(field, query, indices)
+        if indices is None:
+            indices = range(len(fc.values))
+        # a multivalue candidate scores as its best-matching value
+        best = {}
+        for i, score in zip(indices, scores):
+            owner = fc.owners[i]
+            if score > best.get(owner, -1):
+                best[owner] = score
+        matches = [(fc.ids[owner], score) for (owner, score) in sorted(best.items())
+                   if score >= self.fuzzy_score_match_threshold and fc.ids[owner] is not None]
+        return self.top_matches(matches)
+
+    def search(self, query, is_cancelled=None):
         """Launch a search to the entry collection
         """
         if not query:
             return []
-        results_ids, match_scores = [], []
+        self.get_candidates()
+        query = self.preprocess_query(query)
+        # token matches are not used to narrow the search, as fuzzy matches lack some of the query tokens
+        # when the query extends the previous one, e.g. while typing, only values that may still match are scored
+        previous = self.session if self.session is not None and self.session.is_extended_by(query) else None
+        session = SearchSession(query)
+        # best score per id, in order of first match
+        match_scores = {}
         # perform the search on all searchable fields
         for field in self.searchable_fields:
-            # self.visual.debug(f"Searching field {field} for {query}")
-            res = self.filter_entry_by_key(field, query, reference_entries=self.data)
-            ids, scores = [r[0] for r in res], [r[1] for r in res]
-            for i in range(len(ids)):
-                if ids[i] in results_ids:
-                    existing_idx = results_ids.index(ids[i])
-                    # replace score, if it's higher
-                    if scores[i] > match_scores[existing_idx]:
-                        match_scores[existing_idx] = scores[i]
-                else:
-                    # if not there, just append
-                    results_ids.append(ids[i])
-                    match_scores.append(scores[i])
-
-        results_ids = sorted(zip(results_ids, match_scores), key=lambda x: x[1], reverse=True)
+            if is_cancelled is not None and is_cancelled():
+                return None
+            for eid, score in self.rank_field(field, query, session, previous):
+                if score > match_scores.get(eid, -1):
+                    match_scores[eid] = score
+        self.session = session
         # apply max search results filtering
-        results_ids = results_ids[:self.max_search_num]
-        results_ids, match_scores = [r[0] for r in results_ids], [r[1] for r in results_ids]
-
-        return results_ids
-
-    def filter_entry_by_key(self, filter_key, filter_value, reference_entries):
-        if filter_key not in self.searchable_fields:
-            self.visual.warn("Must filter with a key in: {}".format(self.searchable_fields))
-            return
-        candidate_values = []
-        searched_entry_ids = []
-        # get candidate values, as key to a value: entry_id dict
-        for entry_dict in reference_entries:
-            eid = entry_dict["ID"]
-            try:
-                value = entry_dict[filter_key]
-            except KeyError:
-                continue
-            if value is None or len(value) == 0:
-                continue
-
-            if type(value) == str:
-                value = value.lower()
-            searched_entry_ids.append(eid)
-            candidate_values.append(value)
-
-        # search and return ids of results
-        res = self.fuzzy_search(filter_value, candidate_values, self.is_multivalue_key(filter_key))
-        if filter_key == "ID":
-            # return the IDs
-            return [r[0] for r in res]
-        elif filter_key == "title":
-            # get ids
-            res_ids, scores  = [], []
-
-            for t in res:
-                (title, idx), score = t
-                res_ids.append(reference_entries[idx]["ID"])
-                scores.append(score)
-            return list(zip(res_ids, scores))
-        elif self.is_multivalue_key(filter_key):
-            # limit results per keyword
-            res = [(searched_entry_ids[r[1]], r[0][1]) for r in res]
-        return res
+        results = self.top_matches(list(match_scores.items()))
+        return [r[0] for r in results]
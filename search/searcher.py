@@ -1,7 +1,40 @@
+from contextlib import contextmanager
+
+
 class Searcher:
     """Abstract class for searching"""
-    def prepare(self, data_dict):
+    def prepare(self, data_dict, config_dir, max_search_num, searchable_fields=None, source_path=None):
+        pass
+
+    def search(self, query, is_cancelled=None):
+        """Search for the query, stopping early with None results if is_cancelled returns True"""
+        pass
+
+    def set_token_index(self, token_index):
+        """Use the token index of the collection, kept up to date with its changes"""
+        pass
+
+    def set_prefilter_overlap(self, overlap):
+        """Set the fraction of query n-grams a value must contain to be scored"""
         pass
 
-    def search(self, query):
-        pass
\ No newline at end of file
+    def update_add(self, entry_dict):
+        """Add a single entry to the searchable data"""
+        pass
+
+    def update_remove(self, entry_id):
+        """Remove a single entry from the searchable data"""
+        pass
+
+    @contextmanager
+    def batch(self):
+        """Group the updates within the context, e.g. into a single index commit"""
+        yield
+
+    def close(self):
+        """Release the resources of the searcher"""
+        pass
+
+    def sync_source(self, source_path):
+        """Mark the searchable data as consistent with the source file"""
+        pass
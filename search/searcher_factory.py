@@ -1,9 +1,14 @@
+from search.bm25_searcher import BM25Searcher
 from search.fuzzy_searcher import FuzzySearcher
 from search.whoosh_searcher import WhooshSearcher
 
+available_searchers = [FuzzySearcher.name, WhooshSearcher.name, BM25Searcher.name]
+
 def create_searcher(name):
     if name == FuzzySearcher.name:
         return FuzzySearcher()
     if name == WhooshSearcher.name:
         return WhooshSearcher()
+    if name == BM25Searcher.name:
+        return BM25Searcher()
     return None
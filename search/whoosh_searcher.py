@@ -1,19 +1,82 @@
-from whoosh.index import create_in
+import json
+from collections import OrderedDict
+from contextlib import contextmanager
+from whoosh.index import create_in, exists_in, open_dir
 from whoosh.fields import Schema, TEXT, ID, DATETIME, KEYWORD, NGRAMWORDS
 from whoosh.qparser import QueryParser, MultifieldParser
 from whoosh.qparser import FuzzyTermPlugin
 
-from os import makedirs
-from os.path import join
+from os import makedirs, remove
+from os.path import exists, join
 
-class WhooshSearcher:
+import utils
+from search.searcher import Searcher
+
+class WhooshSearcher(Searcher):
     name = "whoosh"
+    # number of parsed queries kept
+    query_cache_size = 256
+    # long-lived index searcher, refreshed after commits
+    searcher = None
+    # writer shared by the updates of a batch, committed at its end
+    batch_writer = None
+
+    def read_state(self):
+        """Read the source file stamp the index was built from"""
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def invalidate_state(self):
+        """Mark the index as diverging from the source file"""
+        if exists(self.state_path):
+            remove(self.state_path)
+
+    def sync_source(self, source_path):
+        """Stamp the index as consistent with the source file"""
+        if source_path is None or not exists(source_path):
+            return
+        with open(self.state_path, "w") as f:
+            json.dump(utils.file_stamp(source_path), f)
+
+    def get_writer(self):
+        """Get the batch writer, or a new writer to commit after a single update"""
+        self.invalidate_state()
+        if self.batch_writer is not None:
+            return self.batch_writer, False
+        return self.ix.writer(), True
+
+    def commit(self, wr):
+        wr.commit()
+        self.index_changed = True
+
+    @contextmanager
+    def batch(self):
+        """Apply the updates within the context in a single commit"""
+        if self.batch_writer is not None:
+            # nested batches join the outer one
+            yield
+            return
+        self.invalidate_state()
+        self.batch_writer = self.ix.writer()
+        try:
+            yield
+        except Exception:
+            self.batch_writer.cancel()
+            raise
+        else:
+            self.commit(self.batch_writer)
+        finally:
+            self.batch_writer = None
 
     def update_remove(self, entry_id):
         """Remove single entry to the index"""
-        wr = self.ix.writer()
-        wr.delete_by_term(id, entry_id)
-        wr.commit()
+        wr, do_commit = self.get_writer()
+        wr.delete_by_term("id", entry_id)
+        if do_commit:
+            self.commit(wr)
 
     def keywordize_authors(self, raw_authors):
         # treat each author name as a keyword to trigger high match score
@@ -25,43 +88,79 @@ class WhooshSearcher:
         return auth_text.lower()
 
     def update_add(self, entry_dict, wr=None, do_commit=True):
-        """Add single entry to the index"""
+        """Add single entry to the index, with the batch writer within a batch"""
         if wr is None:
-            wr = self.ix.writer()
+            wr, do_commit = self.get_writer()
 
         auth_text = self.keywordize_authors(entry_dict["author"])
-        if "bengio" in entry_dict["ID"]:
-            print(auth_text)
         kw_text = " ".join(entry_dict["keywords"]) if "keywords" in entry_dict else ""
         kw_text = kw_text.lower()
         wr.add_document(title=entry_dict["title"], id=entry_dict["ID"], year=entry_dict["year"], authors=auth_text, keywords=kw_text)
         if do_commit:
-            wr.commit()
+            self.commit(wr)
 
-    def prepare(self, data_dict, config_dir, max_search_num, search_by_fields=None):
+    def build(self, data_dict):
         """Build the index from the collection entries"""
         schema = Schema(title=TEXT, id=ID(stored=True), year=DATETIME, authors=KEYWORD, keywords=KEYWORD)
-        index_dir = join(config_dir, 'index')
-        makedirs(index_dir, exist_ok=True)
-        self.ix = create_in(index_dir, schema)
+        self.ix = create_in(self.index_dir, schema)
         writer = self.ix.writer()
         for entry_dict in data_dict.values():
             self.update_add(entry_dict, wr=writer, do_commit=False)
         writer.commit()
 
+    def prepare(self, data_dict, config_dir, max_search_num, search_by_fields=None, source_path=None):
+        """Open the persisted index, rebuilding it only if the source file has changed"""
+        self.index_dir = join(config_dir, 'index')
+        self.state_path = join(self.index_dir, "state.json")
+        makedirs(self.index_dir, exist_ok=True)
+        if exists_in(self.index_dir) and utils.stamp_matches(self.read_state(), source_path):
+            self.ix = open_dir(self.index_dir)
+        else:
+            self.invalidate_state()
+            self.build(data_dict)
+            self.sync_source(source_path)
+
         self.max_search_num = max_search_num
         self.search_by_fields = self.ix.schema._fields if search_by_fields is None else search_by_fields
+        self.parser = MultifieldParser(self.search_by_fields, self.ix.schema)
+        # parser.add_plugin(FuzzyTermPlugin())
+        self.parsed_queries = OrderedDict()
+        self.index_changed = False
 
-    def search(self, raw_query):
+    def get_searcher(self):
+        """Get the long-lived index searcher, refreshing it if the index was committed to since"""
+        if self.searcher is None:
+            self.searcher = self.ix.searcher()
+        elif self.index_changed:
+            # reuses the unchanged segments, releasing the rest of the previous reader
+            self.searcher = self.searcher.refresh()
+        self.index_changed = False
+        return self.searcher
+
+    def parse(self, raw_query):
+        """Parse a query, reusing the parsing of recent queries"""
+        query = self.parsed_queries.get(raw_query)
+        if query is None:
+            query = self.parser.parse(raw_query)
+            self.parsed_queries[raw_query] = query
+            if len(self.parsed_queries) > self.query_cache_size:
+                self.parsed_queries.popitem(last=False)
+        else:
+            self.parsed_queries.move_to_end(raw_query)
+        return query
+
+    def search(self, raw_query, is_cancelled=None):
         """Perform a search across all fields"""
-        searcher = self.ix.searcher()
-        parser = MultifieldParser(self.search_by_fields, self.ix.schema)
-        # parser.add_plugin(FuzzyTermPlugin())
-        query = parser.parse(raw_query)
-        res = searcher.search(query, limit=self.max_search_num)
+        res = self.get_searcher().search(self.parse(raw_query), limit=self.max_search_num)
         results = [r['id'] for r in res]
         return results
 
+    def close(self):
+        """Close the index searcher"""
+        if self.searcher is not None:
+            self.searcher.close()
+            self.searcher = None
+
         # ids, scores = [], []
         # # perform a search over all fields in the schema
         # for field in self.ix.schema._fields:
@@ -17,11 +17,12 @@ class Selector:
         if self.cached_selection is not None:
             # remap the selected indices by id
             selected_ids = [self.entry_id_list[i] for i in self.cached_selection]
-            covered_ids = [x for x in selected_ids if x in entry_id_list]
-            lost_ids = [x for x in selected_ids if x not in entry_id_list]
+            positions = {eid: i for (i, eid) in enumerate(entry_id_list)}
+            covered_ids = [x for x in selected_ids if x in positions]
+            lost_ids = [x for x in selected_ids if x not in positions]
             if lost_ids:
                 self.visual.error(f"Selection not covered by new reference entry list -- droping {len(lost_ids)} entries: {lost_ids}")
-            self.cached_selection = [entry_id_list.index(c) for c in covered_ids]
+            self.cached_selection = [positions[c] for c in covered_ids]
         self.entry_id_list = entry_id_list
         # reset the sorting index, if any
         self.visual.reset_sorting_index()
@@ -47,10 +48,11 @@ class Selector:
         if type(inp) is not list:
             inp = [inp]
         entry_indexes = []
+        positions = {eid: i for (i, eid) in enumerate(self.entry_id_list)}
         for eid in inp:
-            if eid not in self.entry_id_list:
+            if eid not in positions:
                 continue
-            entry_indexes.append(self.entry_id_list.index(eid))
+            entry_indexes.append(positions[eid])
         if not entry_indexes:
             self.visual.error(f"Unable to match any entry id from {inp}")
             return None
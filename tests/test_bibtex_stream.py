@@ -0,0 +1,48 @@
+import warnings
+
+import pytest
+
+pytest.importorskip("bibtexparser")
+
+from reader.bibtex_stream import RecordParser, iter_records, parse_records
+
+records = [
+    "@string{conf = {Conference}}\n",
+    "@article{smith2020,\n  title = {Deep Learning},\n  journal = conf\n}\n",
+    "@inproceedings{doe2019,\n  title = {Shallow Nets},\n  year = {2019}\n}\n",
+]
+
+
+def write_bib(tmp_path, texts):
+    path = tmp_path / "lib.bib"
+    path.write_text("".join(texts))
+    return str(path)
+
+
+def test_record_parser_parses_records_without_warnings(tmp_path):
+    path = write_bib(tmp_path, records)
+    parser = RecordParser()
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        entries = [entry for (start, _, text) in iter_records(path) for entry in parser.parse(text, start)]
+    assert not [w for w in caught if "more than once" in str(w.message)]
+    assert [e["ID"] for e in entries] == ["smith2020", "doe2019"]
+    # macros defined in earlier records are resolved
+    assert entries[0]["journal"] == "Conference"
+
+
+def test_malformed_record_reports_its_offset(tmp_path):
+    malformed = "@article{broken,\n  title = {Unclosed,\n  year = 2020\n}\n"
+    path = write_bib(tmp_path, records + [malformed])
+    parser = RecordParser()
+    with pytest.raises(ValueError, match="at byte {}".format(len("".join(records)))):
+        for start, _, text in iter_records(path):
+            parser.parse(text, start)
+
+
+def test_parse_records_locates_malformed_record_in_chunk():
+    malformed = "@article{broken\n  title = {Unclosed}\n}\n"
+    chunk = [(10, records[1]), (80, malformed), (150, records[2])]
+    assert [e["ID"] for e in parse_records([chunk[0], chunk[2]], macros=records[0])] == ["smith2020", "doe2019"]
+    with pytest.raises(ValueError, match="at byte 80"):
+        parse_records(chunk, macros=records[0])
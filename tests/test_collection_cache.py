@@ -0,0 +1,46 @@
+import os
+
+from reader.collection_cache import CollectionCache
+
+
+class Visual:
+    def log(self, msg):
+        pass
+
+
+def make_cache(tmp_path):
+    source = tmp_path / "lib.bib"
+    source.write_text("@article{a, title={A}}\n")
+    cache = CollectionCache(str(tmp_path / "cache"), Visual())
+    cache.store({"entries": ["a"]}, str(source), {"tags": 1})
+    return cache, source
+
+
+def test_cached_state_is_loaded_for_an_unchanged_source(tmp_path):
+    cache, source = make_cache(tmp_path)
+    assert cache.load(str(source), {"tags": 1}) == {"entries": ["a"]}
+
+
+def test_changed_source_or_tags_invalidate_the_cache(tmp_path):
+    cache, source = make_cache(tmp_path)
+    assert cache.load(str(source), {"tags": 2}) is None
+    # same size, different contents and mtime
+    source.write_text("@article{b, title={B}}\n")
+    st = os.stat(source)
+    os.utime(source, (st.st_atime, st.st_mtime + 10))
+    assert cache.load(str(source), {"tags": 1}) is None
+    source.unlink()
+    assert cache.load(str(source), {"tags": 1}) is None
+
+
+def test_touched_source_with_the_same_contents_keeps_the_cache(tmp_path):
+    cache, source = make_cache(tmp_path)
+    st = os.stat(source)
+    os.utime(source, (st.st_atime, st.st_mtime + 10))
+    assert cache.load(str(source), {"tags": 1}) == {"entries": ["a"]}
+
+
+def test_stale_cache_version_is_ignored(tmp_path, monkeypatch):
+    cache, source = make_cache(tmp_path)
+    monkeypatch.setattr(CollectionCache, "version", CollectionCache.version + 1)
+    assert cache.load(str(source), {"tags": 1}) is None
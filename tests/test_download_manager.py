@@ -0,0 +1,97 @@
+from getters import download_manager
+from getters.download_manager import DownloadManager
+
+
+class Visual:
+    def __init__(self):
+        self.logs = []
+
+    def log(self, msg):
+        self.logs.append(msg)
+
+    def error(self, msg):
+        self.logs.append(msg)
+
+
+class Response:
+    """Streamed response serving the requested byte range of some contents"""
+    def __init__(self, contents, headers, supports_range=True):
+        start = 0
+        if supports_range and "Range" in headers:
+            start = int(headers["Range"][len("bytes="):-1])
+        self.status_code = 206 if start else 200
+        if start >= len(contents) > 0:
+            self.status_code = 416
+        self.body = contents[start:]
+        self.headers = {"Content-Length": str(len(self.body))}
+
+    def raise_for_status(self):
+        if self.status_code >= 400 and self.status_code != 416:
+            raise ValueError(self.status_code)
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def serve(monkeypatch, contents, supports_range=True):
+    """Serve url to contents mappings, recording the requested headers"""
+    requests = []
+
+    def request(url, stream=False, headers=None):
+        requests.append(headers)
+        return Response(contents[url], headers or {}, supports_range)
+    monkeypatch.setattr(download_manager.HttpSession, "request", staticmethod(request))
+    return requests
+
+
+def test_partial_download_is_resumed_with_a_range_request(tmp_path, monkeypatch):
+    requests = serve(monkeypatch, {"url": b"0123456789"})
+    output_path = str(tmp_path / "a.pdf")
+    with open(output_path + DownloadManager.part_suffix, "wb") as f:
+        f.write(b"0123")
+    manager = DownloadManager(Visual())
+    assert manager.download("url", output_path) == (output_path, False)
+    assert requests == [{"Range": "bytes=4-"}]
+    with open(output_path, "rb") as f:
+        assert f.read() == b"0123456789"
+    assert not (tmp_path / "a.pdf.part").exists()
+
+
+def test_resume_restarts_without_range_support(tmp_path, monkeypatch):
+    serve(monkeypatch, {"url": b"0123456789"}, supports_range=False)
+    output_path = str(tmp_path / "a.pdf")
+    with open(output_path + DownloadManager.part_suffix, "wb") as f:
+        f.write(b"xx")
+    DownloadManager(Visual()).download("url", output_path)
+    with open(output_path, "rb") as f:
+        assert f.read() == b"0123456789"
+
+
+def test_identical_downloads_point_to_the_first_file(tmp_path, monkeypatch):
+    serve(monkeypatch, {"a": b"same", "b": b"same", "c": b"other"})
+    jobs = [(key, key, str(tmp_path / (key + ".pdf"))) for key in "abc"]
+    completed = {}
+    failed, duplicates = DownloadManager(Visual(), num_workers=1).download_all(jobs, completed.__setitem__)
+    assert failed == [] and duplicates == ["b"]
+    assert completed == {"a": jobs[0][2], "b": jobs[0][2], "c": jobs[2][2]}
+    assert not (tmp_path / "b.pdf").exists()
+
+
+def test_different_existing_file_is_not_overwritten(tmp_path, monkeypatch):
+    serve(monkeypatch, {"url": b"new"})
+    output_path = tmp_path / "a.pdf"
+    output_path.write_bytes(b"old")
+    path, is_duplicate = DownloadManager(Visual()).download("url", str(output_path))
+    assert path == str(tmp_path / "a_1.pdf") and not is_duplicate
+    assert output_path.read_bytes() == b"old"
+    assert (tmp_path / "a_1.pdf").read_bytes() == b"new"
+    # an identical existing file is reused instead
+    assert DownloadManager(Visual()).download("url", path) == (path, False)
+    assert not (tmp_path / "a_1_1.pdf").exists()
@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip("bibtexparser")
+pytest.importorskip("blessed")
+pytest.importorskip("terminaltables")
+
+from bibtexparser.bibdatabase import BibDatabase
+
+from reader.entry import Entry
+from reader.entry_collection import EntryCollection
+from reader.filter_engine import FilterEngine
+
+
+class Visual:
+    def log(self, msg):
+        pass
+
+    def error(self, msg):
+        raise AssertionError(msg)
+
+
+def make_collection(monkeypatch):
+    monkeypatch.setattr(EntryCollection, "visual", Visual())
+    db = BibDatabase()
+    db.entries = [{"ID": "smith{}".format(i), "ENTRYTYPE": "article", "title": title, "author": [author], "year": str(year)}
+                  for (i, (title, author, year)) in enumerate([
+                      ("Deep learning", "Smith, John", 2018), ("Deep nets", "Doe, Jane", 2020),
+                      ("Shallow learning", "Smith, Anna", 2020), ("Graphs", "Roe, Jim", 2015),
+                      ("Deeper graphs", "Doe, John", 2022)])]
+    return EntryCollection(db, {"keep": [], "map": {}})
+
+
+def brute_force(engine, collection, filters_str):
+    filters = engine.parse_filters(filters_str)
+    return [ID for ID in collection.id_list if all(f.satisfied_by(collection.entries[ID]) for f in filters)]
+
+
+@pytest.mark.parametrize("filters_str", ["year>=2020", "year<2020", "2020=year", "year=2020, author sw smith",
+                                         "title sw deep", "title=deep nets", "title ew graphs", "year!=2020, author sw doe",
+                                         "title sw deep, year>2019"])
+def test_indexed_filters_match_checking_every_entry(monkeypatch, filters_str):
+    collection = make_collection(monkeypatch)
+    engine = FilterEngine(collection)
+    assert engine.apply(filters_str) == brute_force(engine, collection, filters_str)
+
+
+def test_filters_follow_collection_changes_and_input_ids(monkeypatch):
+    collection = make_collection(monkeypatch)
+    engine = FilterEngine(collection)
+    assert engine.apply("year>2020") == ["smith4"]
+    collection.add_entry(Entry({"ID": "new", "ENTRYTYPE": "article", "title": "Newer", "author": ["Poe, Ed"], "year": "2023"}))
+    assert engine.apply("year>2020") == ["smith4", "new"]
+    # only the input ids are filtered, in their order
+    assert engine.apply("year>2015", ids=["new", "smith0", "smith3"]) == ["new", "smith0"]
+
+
+def test_invalid_filters_raise(monkeypatch):
+    engine = FilterEngine(make_collection(monkeypatch))
+    with pytest.raises(ValueError):
+        engine.apply("year>abc")
+    with pytest.raises(ValueError):
+        engine.apply("nofield=1")
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+pytest.importorskip("fuzzywuzzy")
+
+from reader.token_index import TokenIndex
+from search.fuzzy_searcher import FuzzySearcher
+
+fields = ["ID", "title", "author", "keywords"]
+words = ["retrieval", "index", "learning", "ranking", "neural", "graph", "search", "fuzzy", "models", "sparse",
+         "dense", "query", "expansion", "language", "transformer", "evaluation", "benchmark", "kernel"]
+names = ["smith", "garcia", "nguyen", "ivanova", "kim", "rossi", "novak", "tanaka"]
+
+
+def make_data(num_entries, seed=0):
+    rng = random.Random(seed)
+    # partial_ratio("ranki", title) is 60, above the 25 of its "rank" prefix
+    data = {"ir2020": {"ID": "ir2020", "title": "retrieval index learning", "author": ["smith"], "keywords": []}}
+    for i in range(num_entries):
+        ID = "{}{}{}".format(rng.choice(names), 2000 + i % 25, "abcdefgh"[i % 8])
+        data[ID] = {"ID": ID, "title": " ".join(rng.choice(words) for _ in range(rng.randint(2, 6))),
+                    "author": rng.sample(names, rng.randint(1, 3)), "keywords": rng.sample(words, rng.randint(0, 2))}
+    return data
+
+
+def make_searcher(data):
+    searcher = FuzzySearcher()
+    searcher.prepare(data, None, None, fields)
+    return searcher
+
+
+def typed_queries(num_queries, seed=1):
+    """Queries of a few words, some of them with a typo"""
+    rng = random.Random(seed)
+    queries = ["ranking index", "retrieval index learning"]
+    for _ in range(num_queries):
+        query = " ".join(rng.choice(words + names) for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.5:
+            i = rng.randrange(len(query))
+            query = query[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + query[i + 1:]
+        queries.append(query)
+    return queries
+
+
+def test_incremental_search_matches_full_search():
+    data = make_data(80)
+    incremental, full = make_searcher(data), make_searcher(data)
+    for query in typed_queries(8):
+        for end in range(1, len(query) + 1):
+            prefix = query[:end]
+            # a fresh session scores every value
+            full.session = None
+            assert incremental.search(prefix) == full.search(prefix), prefix
+
+
+def test_extending_query_skips_values():
+    searcher = make_searcher(make_data(80))
+    num_scored = []
+    score = searcher.score
+
+    def counting_score(field, query, indices=None):
+        num_scored.append(len(searcher.candidates[field].values) if indices is None else len(indices))
+        return score(field, query, indices)
+    searcher.score = counting_score
+    searcher.search("ret")
+    num_first = sum(num_scored)
+    num_scored.clear()
+    searcher.search("retrieval index")
+    assert sum(num_scored) < num_first
+
+
+class FieldEntry(dict):
+    def get_field(self, field):
+        return self.get(field)
+
+
+def test_token_index_does_not_narrow_results():
+    data = make_data(80)
+    token_index = TokenIndex()
+    for ID, entry_dict in data.items():
+        token_index.add(ID.lower(), FieldEntry(entry_dict))
+    indexed, plain = make_searcher(data), make_searcher(data)
+    indexed.set_token_index(token_index)
+    # exact tokens, whose one character shorter prefixes also match fuzzily
+    for query in ["retrieval index", "ranking", "smith graph", "neural models"]:
+        for prefix in [query[:-1], query]:
+            indexed.session = plain.session = None
+            assert indexed.search(prefix) == plain.search(prefix), prefix
@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from reader.indexed_store import IndexedStore
+
+
+def test_store_matches_a_list_under_random_operations():
+    rng = random.Random(0)
+    store, reference = IndexedStore(), []
+    next_key = 0
+    for _ in range(2000):
+        op = rng.random()
+        if op < 0.5 or not reference:
+            store.append(next_key)
+            reference.append(next_key)
+            next_key += 1
+        elif op < 0.8:
+            key = rng.choice(reference)
+            store.remove(key)
+            reference.remove(key)
+        else:
+            key = rng.choice(reference)
+            store.replace(key, next_key)
+            reference[reference.index(key)] = next_key
+            next_key += 1
+        position = rng.randrange(len(reference)) if reference else None
+        if position is not None:
+            assert store[position] == reference[position]
+            assert store.index(reference[position]) == position
+        assert len(store) == len(reference)
+    assert store == reference
+    assert store[-1] == reference[-1]
+    assert store[1:5] == reference[1:5]
+
+
+def test_invalid_keys_and_positions_raise():
+    store = IndexedStore(["a", "b"])
+    with pytest.raises(ValueError):
+        store.append("a")
+    with pytest.raises(ValueError):
+        store.remove("c")
+    with pytest.raises(ValueError):
+        store.index("c")
+    with pytest.raises(ValueError):
+        store.replace("a", "b")
+    with pytest.raises(IndexError):
+        store[2]
+    assert "a" in store and "c" not in store
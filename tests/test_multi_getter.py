@@ -0,0 +1,65 @@
+import threading
+import time
+
+from getters.multi_getter import MultiGetter
+from visual.io import Io, capturable
+
+
+class Visual(Io):
+    def __init__(self):
+        self.logs, self.errors = [], []
+
+    @capturable
+    def log(self, msg):
+        self.logs.append(msg)
+
+    @capturable
+    def error(self, msg):
+        self.errors.append(msg)
+
+
+class Getter:
+    def __init__(self, results, delay=0, error=None):
+        self.results, self.delay, self.error = results, delay, error
+
+    def get_web_bibtex(self, query):
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+
+def test_timed_out_getter_is_skipped_on_a_daemon_thread():
+    visual = Visual()
+    apis = {"fast": Getter([{"title": "A", "doi": "1"}]), "slow": Getter([{"title": "B"}], delay=5),
+            "broken": Getter(None, error=ValueError("boom"))}
+    getter = MultiGetter(apis, visual, timeouts={"slow": 0.1})
+    start = time.monotonic()
+    results = list(getter.iter_results("query"))
+    assert time.monotonic() - start < 2
+    assert results == [("fast", [{"title": "A", "doi": "1"}])]
+    assert any("slow timed out" in msg for msg in visual.logs)
+    assert any("broken failed: boom" in msg for msg in visual.errors)
+    # the running slow getter does not block interpreter exit
+    assert all(thread.daemon for thread in threading.enumerate() if thread.name == "getter-slow")
+
+
+def test_results_are_deduplicated_by_doi_and_title():
+    apis = {"a": Getter([{"title": "Some {Title}", "doi": "10.1/X"}]),
+            "b": Getter([{"title": "Other", "doi": "10.1/x"}, "@article{k,\n title = {some title.},\n}"], delay=0.1)}
+    results = MultiGetter(apis, Visual()).get_web_bibtex("query")
+    assert results == [{"title": "Some {Title}", "doi": "10.1/X"}]
+
+
+def test_getter_output_is_collected_for_a_capturing_thread():
+    class LoggingGetter(Getter):
+        def get_web_bibtex(self, query):
+            visual.log("searching " + query)
+            return super().get_web_bibtex(query)
+    visual = Visual()
+    getter = MultiGetter({"a": LoggingGetter([{"title": "A"}])}, visual)
+    with visual.capture_output() as output:
+        assert getter.get_web_bibtex("query") == [{"title": "A"}]
+    assert visual.logs == []
+    visual.show_output(output)
+    assert visual.logs == ["searching query", "Getter a returned 1 result(s), 1 new."]
@@ -0,0 +1,30 @@
+from reader.sorted_view import SortedView
+
+
+class ValueEntry(dict):
+    def get_value(self, key, postproc=False):
+        return self[key]
+
+
+def make_entries(years):
+    return {ID: ValueEntry(year=year) for (ID, year) in years.items()}
+
+
+def test_order_keeps_input_order_among_equal_keys():
+    entries = make_entries({"b": "2020", "a": "2020", "c": "2019", "d": "2020"})
+    view = SortedView("year", entries)
+    ids = ["d", "b", "c", "a"]
+    # as a stable sort on the column would order them
+    assert view.order(ids) == sorted(ids, key=lambda ID: entries[ID]["year"])
+    assert view.order(["a", "d", "b"]) == ["a", "d", "b"]
+
+
+def test_add_and_remove_keep_the_view_sorted():
+    entries = make_entries({"a": "2020", "b": "2018"})
+    view = SortedView("year", entries)
+    entries["c"] = ValueEntry(year="2019")
+    view.add("c", entries["c"])
+    assert view.order(["a", "b", "c"]) == ["b", "c", "a"]
+    view.remove("b", entries["b"])
+    assert len(view) == 2
+    assert view.order(["a", "c"]) == ["c", "a"]
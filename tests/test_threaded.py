@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from thread.threaded import DebouncedExecutor
+
+
+def test_flush_returns_latest_result_only():
+    runs, shown = [], []
+
+    def function(query, is_cancelled):
+        runs.append(query)
+        return query.upper()
+    executor = DebouncedExecutor(function, 0.05, on_result=lambda args, result: shown.append(result))
+    try:
+        for query in ["a", "ab", "abc"]:
+            executor.submit(query)
+        assert executor.flush() == "ABC"
+    finally:
+        executor.stop()
+    # earlier submissions were superseded before their delay passed
+    assert runs == ["abc"]
+    assert shown == ["ABC"]
+
+
+def test_superseded_run_is_cancelled_and_not_delivered():
+    started, shown = threading.Event(), []
+
+    def function(query, is_cancelled):
+        if query == "slow":
+            started.set()
+            while not is_cancelled():
+                time.sleep(0.001)
+            return "stale"
+        return query
+    executor = DebouncedExecutor(function, 0, on_result=lambda args, result: shown.append(result))
+    try:
+        executor.submit("slow")
+        assert started.wait(1)
+        executor.submit("fast")
+        assert executor.flush() == "fast"
+    finally:
+        executor.stop()
+    assert shown == ["fast"]
+
+
+def test_flush_raises_the_error_of_a_failed_run():
+    shown = []
+
+    def function(query, is_cancelled):
+        raise ValueError(query)
+    executor = DebouncedExecutor(function, 0, on_result=lambda args, result: shown.append(result))
+    try:
+        executor.submit("bad")
+        with pytest.raises(ValueError):
+            executor.flush()
+    finally:
+        executor.stop()
+    assert shown == []
+
+
+def test_flush_without_submissions_returns_none():
+    executor = DebouncedExecutor(lambda query, is_cancelled: query, 0)
+    try:
+        assert executor.flush() is None
+    finally:
+        executor.stop()
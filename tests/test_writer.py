@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("bibtexparser")
+pytest.importorskip("blessed")
+pytest.importorskip("terminaltables")
+
+from reader.bibtex_stream import scan_record_offsets
+from writer import Writer
+
+library = (
+    "% comment\n"
+    "@article{a,\n  title = {A}\n}\n"
+    "\n@string{conf = {Conference}}\n"
+    "@article{b,\n  title = {B}\n}\n"
+    "@article{c,\n  title = {C}\n}\n"
+)
+
+
+class Visual:
+    def log(self, msg):
+        pass
+
+    def error(self, msg):
+        raise AssertionError(msg)
+
+
+class Collection:
+    """Collection of raw record texts, changed since read from the library"""
+    def __init__(self, path, entries, changed):
+        self.path, self.entries, self.changed = path, entries, changed
+        self.id_list = list(entries)
+        self.written_offsets = None
+
+    def source_unchanged(self, path):
+        return path == self.path
+
+    def get_source_offsets(self):
+        return scan_record_offsets(self.path)
+
+    def get_changed_ids(self):
+        return set(self.changed)
+
+    def mark_written(self, path, offsets=None):
+        self.written_offsets = offsets
+
+
+def write_incrementally(tmp_path, monkeypatch, entries, changed):
+    path = tmp_path / "lib.bib"
+    path.write_bytes(library.encode())
+    monkeypatch.setattr(Writer, "record_bytes", staticmethod(lambda entry: entry.encode()))
+    writer = Writer.__new__(Writer)
+    writer.bib_path, writer.visual = str(path), Visual()
+    collection = Collection(str(path), entries, changed)
+    assert writer.write_incremental(collection)
+    return path.read_bytes(), collection.written_offsets
+
+
+def records(contents, offsets):
+    return {ID: contents[start:end].decode() for (ID, (start, end)) in offsets.items()}
+
+
+def test_patched_offsets_point_to_the_written_records(tmp_path, monkeypatch):
+    entries = {"a": "@article{a,\n  title = {A}\n}\n", "c": "@article{c,\n  title = {A much longer C}\n}\n",
+               "d": "@article{d,\n  title = {D}\n}\n"}
+    contents, offsets = write_incrementally(tmp_path, monkeypatch, entries, ["c", "d"])
+    # b is dropped, c rewritten and d appended, keeping the text between records
+    assert contents.decode() == ("% comment\n" + entries["a"] + "\n@string{conf = {Conference}}\n"
+                                 + entries["c"] + "\n" + entries["d"])
+    assert records(contents, offsets) == entries
+    assert offsets == scan_record_offsets(str(tmp_path / "lib.bib"))
+
+
+def test_appended_records_extend_the_offsets(tmp_path, monkeypatch):
+    entries = {"a": None, "b": None, "c": None, "d": "@article{d,\n  title = {D}\n}\n"}
+    contents, offsets = write_incrementally(tmp_path, monkeypatch, entries, ["d"])
+    assert contents.decode() == library + "\n" + entries["d"]
+    assert records(contents, {"d": offsets["d"]}) == {"d": entries["d"]}
+    assert offsets == scan_record_offsets(str(tmp_path / "lib.bib"))
@@ -305,6 +305,106 @@ class TimedThreadRunner:
     #     """Starts the threaded function"""
     #     self.thread.join()
 
+class DebouncedExecutor:
+    """Single long-lived worker, running the latest submitted arguments once submissions pause for a delay
+
+    Each submission supersedes the pending or running one. The function receives an is_cancelled callable
+    to stop superseded runs early, and only results of the latest submission are delivered.
+    """
+    def __init__(self, function, delay, on_result=None, name="Debounced"):
+        """
+        function: callable on (args, is_cancelled)
+        delay: seconds without new submissions before running
+        on_result: callable on (args, result), called from the worker thread for non-superseded results,
+            holding off new submissions until it returns
+        """
+        self.function = function
+        self.delay = delay
+        self.on_result = on_result
+        self.condition = threading.Condition()
+        # incremented per submission, to tell superseded runs
+        self.generation = 0
+        # (generation, args, submission time) waiting to run
+        self.pending = None
+        # (generation, result, raised exception) of the latest completed run
+        self.result = (0, None, None)
+        self.is_running = True
+        self.thread = threading.Thread(target=self.loop, daemon=True, name=name)
+        self.thread.start()
+
+    def submit(self, args):
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, args, time.monotonic())
+            self.condition.notify_all()
+            return self.generation
+
+    def is_superseded(self, generation):
+        return generation != self.generation or not self.is_running
+
+    def next_task(self):
+        """Wait for a pending submission to be due, returning it, or None when stopped"""
+        with self.condition:
+            while self.is_running:
+                if self.pending is None:
+                    self.condition.wait()
+                    continue
+                remaining = self.pending[2] + self.delay - time.monotonic()
+                if remaining <= 0:
+                    task, self.pending = self.pending, None
+                    return task
+                self.condition.wait(remaining)
+            return None
+
+    def loop(self):
+        while True:
+            task = self.next_task()
+            if task is None:
+                return
+            generation, args, _ = task
+            result, error = None, None
+            try:
+                result = self.function(args, lambda: self.is_superseded(generation))
+            except Exception as ex:
+                logging.getLogger(__name__).exception(ex)
+                error = ex
+            with self.condition:
+                if self.is_superseded(generation):
+                    continue
+                self.result = (generation, result, error)
+                # delivered before any submission can supersede it
+                if self.on_result is not None and error is None:
+                    self.on_result(args, result)
+                self.condition.notify_all()
+
+    def flush(self):
+        """Run the latest submission without further delay and return its result
+
+        Returns None if the executor was stopped before delivering it, and raises the exception of a failed run.
+        """
+        with self.condition:
+            generation = self.generation
+            if self.pending is not None:
+                # make it due
+                self.pending = self.pending[:2] + (float("-inf"),)
+                self.condition.notify_all()
+            while self.is_running and self.result[0] != generation and generation == self.generation:
+                self.condition.wait()
+            result_generation, result, error = self.result
+            if result_generation != generation:
+                return None
+            if error is not None:
+                raise error
+            return result
+
+    def stop(self):
+        with self.condition:
+            self.is_running = False
+            self.pending = None
+            self.condition.notify_all()
+        self.thread.join()
+
+
 # test
 def main_test():
     def func(args):
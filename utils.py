@@ -1,6 +1,8 @@
+import hashlib
+import os
 import time
 from collections import namedtuple
-from os.path import basename, join
+from os.path import abspath, basename, exists, join
 from shutil import copyfile
 
 import clipboard
@@ -17,6 +19,39 @@ class Backup:
         copyfile(self.backup_path, self.output_path)
 
 
+def file_hash(path, block_size=1 << 20, algorithm="sha1"):
+    """Compute the digest of the file contents"""
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_stamp(path, with_hash=True):
+    """Get a path / size / mtime / content hash stamp of a file"""
+    st = os.stat(path)
+    stamp = {"path": abspath(path), "size": st.st_size, "mtime": st.st_mtime}
+    if with_hash:
+        stamp["hash"] = file_hash(path)
+    return stamp
+
+def stamp_matches(stamp, path):
+    """Check whether a file stamp still describes the file at the input path"""
+    if not stamp or path is None or not exists(path):
+        return False
+    if stamp.get("path") != abspath(path):
+        return False
+    st = os.stat(path)
+    if st.st_size != stamp["size"]:
+        return False
+    if st.st_mtime == stamp["mtime"]:
+        return True
+    if "hash" not in stamp:
+        return False
+    # touched, but the contents may be the same
+    return file_hash(path) == stamp["hash"]
+
+
 # datetime for timestamps
 def datetime_str():
     return time.strftime("%d%m%y_%H%M%S")
@@ -3,6 +3,7 @@ import threading
 import utils
 from blessed import Terminal
 # from visual.io import Io
+from visual.io import capturable
 from visual.termtables import TermTables
 
 
@@ -38,7 +39,8 @@ class Blessed(TermTables):
 
     access_lock = None
 
-    search_time_delta = 1
+    # seconds without keystrokes before running an incremental search
+    search_time_delta = 0.15
 
     # metakey handling (e.g. C-V)
     key_codes = {'\x16': ('C-V', lambda x: utils.paste())
@@ -127,8 +129,8 @@ class Blessed(TermTables):
         self.commands = conf.get_controls()
         self.selection_commands = conf.get_selection_commands()
 
-        # threading lock
-        self.access_lock = threading.Lock()
+        # threading lock, reentrant since drawing functions log
+        self.access_lock = threading.RLock()
         self.has_realtime_input = True
 
     def print_to_layout(self, msg, prompt, layout, do_clear=True, max_size=None):
@@ -136,6 +138,7 @@ class Blessed(TermTables):
             self.clear_line(layout.y, layout.x)
         self.temp_print(prompt + ": " + msg, *layout.values(), max_size=max_size)
 
+    @capturable
     def log(self, msg):
         self.access_lock.acquire()
         self.log_history.append(msg)
@@ -160,6 +163,7 @@ class Blessed(TermTables):
         self.viewport_top = top_line
         # self.print()
 
+    @capturable
     def print(self, msg=None, temp=False, no_newline=False, limit_dots=False):
         if self.only_debug and not self.do_debug:
             return
@@ -208,16 +212,21 @@ class Blessed(TermTables):
             return self.layout.command.values()
 
     def receive_search(self):
-        done = False
-        if not self.search_cache:
-            self.clear_prompt()
-            self.update_prompt_symbol("/")
+        with self.access_lock:
+            if not self.search_cache:
+                self.clear_prompt()
+                self.update_prompt_symbol("/")
         x, y = self.layout.command.values()
         starting_x = 2
         x += starting_x
 
-        # get_character
+        # get_character, without holding the lock so that search results can be drawn meanwhile
         key = self.input_multichar(x, y, single_char=True, initial_entry=self.search_cache)
+        with self.access_lock:
+            return self.conclude_search_input(key)
+
+    def conclude_search_input(self, key):
+        done = False
         if key == self.search_cache:
             if not self.search_cache_underflow:
                 # enter key or consecutive deletes
@@ -238,6 +247,9 @@ class Blessed(TermTables):
         # return results
         return done, self.search_cache
 
+    def exclusive_access(self):
+        return self.access_lock
+
     def conditional_clear_selection(self, command):
         """Clear the selection cache on selecton-unrelated commands
         """
@@ -366,6 +378,7 @@ class Blessed(TermTables):
             # print("@[{}, {}]: {}".format(x, y, msg))
             print("{}".format(msg))
 
+    @capturable
     def message(self, msg):
         self.print_to_layout(msg, "Message", self.layout.message, do_clear=True, max_size=self.layout.message.w)
 
@@ -374,12 +387,14 @@ class Blessed(TermTables):
         coords = self.layout.command.x + len(prompt) + 1, self.layout.command.y
         return coords
 
+    @capturable
     def debug(self, msg):
         self.print_to_layout(msg, "Debug", self.layout.debug, do_clear=True, max_size=self.layout.debug.w)
 
     def newline(self):
         pass
 
+    @capturable
     def error(self, msg):
         self.message("(!) {}".format(msg))
 
@@ -431,9 +446,14 @@ class Blessed(TermTables):
         """
         # return self.input_multichar(2, 0, single_char=True, initial_entry=initial_entry)
         res = initial_entry if initial_entry is not None else ""
-        concluded = False
         # get key input
         key = self.get_raw_input()
+        with self.access_lock:
+            return self.handle_singlechar(key, res)
+
+    def handle_singlechar(self, key, res):
+        """Apply an input key to the entry string, drawing any of its effects"""
+        concluded = False
         if self.get_metakey(key):
             # metakey handling
             name, func = self.get_metakey(key)
@@ -462,7 +482,8 @@ class Blessed(TermTables):
         res = initial_entry
         while True:
             res, concluded = self.input_singlechar(initial_entry=res)
-            self.temp_print(res, x, y)
+            with self.access_lock:
+                self.temp_print(res, x, y)
             if concluded:
                 break
             if single_char:
@@ -471,11 +492,14 @@ class Blessed(TermTables):
 
     def up(self):
         if not self.use_buffer:
+            # page the listing instead
+            TermTables.up(self)
             return
         self.set_viewport(max(self.viewport_top - 1, 0))
 
     def down(self):
         if not self.use_buffer:
+            TermTables.down(self)
             return
         highest_viewport_top = len(self.data_buffer) - self.data_buffer_size
         self.set_viewport(min(highest_viewport_top, self.viewport_top + 1))
@@ -1,10 +1,25 @@
 import json
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import wraps
 from itertools import combinations
 from visual.filterer import Filterer
 
 import utils
 
 
+def capturable(func):
+    """Decorator that collects the output of threads capturing it, instead of drawing it"""
+    @wraps(func)
+    def wrapper_capturable(self, *args, **kwargs):
+        output = self.get_captured_output()
+        if output is not None:
+            output.append((func.__name__, args, kwargs))
+            return
+        return func(self, *args, **kwargs)
+    return wrapper_capturable
+
+
 class Io:
     name = "default"
 
@@ -22,6 +37,8 @@ class Io:
 
     log_history = []
     sorting_index = []
+    # output collected per thread, while capturing it
+    captured_output = threading.local()
 
     filterer = None
     filtering_keys = "id author year title".split()
@@ -74,6 +91,7 @@ class Io:
     def list(self, content):
         pass
 
+    @capturable
     def print(self, msg=""):
         if self.only_debug and not self.do_debug:
             return
@@ -83,16 +101,46 @@ class Io:
         self.error(msg)
         exit(1)
 
+    @capturable
     def log(self, msg):
         self.log_history.append(msg)
         self.print(msg)
 
+    @capturable
     def message(self, msg):
         self.print(msg)
 
+    @capturable
     def error(self, msg):
         self.print("(!) {}".format(msg))
 
+    def exclusive_access(self):
+        """Context holding off other threads from drawing, e.g. to draw from a worker thread"""
+        return nullcontext()
+
+    def get_captured_output(self):
+        """Get the output collected for the current thread, if capturing it"""
+        return getattr(Io.captured_output, "output", None)
+
+    @contextmanager
+    def capture_output(self, output=None):
+        """Context collecting the output of the current thread, to draw it later with show_output
+
+        output: list to collect to, e.g. the one of the thread that started the current one
+        """
+        if output is None:
+            output = []
+        Io.captured_output.output = output
+        try:
+            yield output
+        finally:
+            Io.captured_output.output = None
+
+    def show_output(self, output):
+        """Draw output collected while capturing it"""
+        for name, args, kwargs in output:
+            getattr(self, name)(*args, **kwargs)
+
     def receive_command(self):
         return self.ask_user()
 
@@ -309,6 +357,7 @@ class Io:
         return data
 
     # print iff in debug mode
+    @capturable
     def debug(self, msg):
         if not self.do_debug:
             return
@@ -326,6 +375,10 @@ class Io:
         if print_newline:
             self.newline()
 
+    def preview_entries(self, entries, entry_collection):
+        """Show the first entries of a collection, while the rest of it is being read"""
+        self.print_entries_enum(entries, entry_collection, do_sort=False)
+
     def get_entry_contents(self, entry):
         if type(entry) != dict:
             entry = entry.get_pretty_dict()
@@ -8,8 +8,46 @@ import utils
 from visual.io import Io
 
 
+class Listing:
+    """Rows of a table listing, turned to strings a window at a time"""
+    def __init__(self, num_rows, get_row, at_most=None, header=None, preserve_col_idx=None):
+        self.num_rows = num_rows
+        self.get_row = get_row
+        self.header = header
+        self.preserve_col_idx = preserve_col_idx
+        # truncated listings keep a line for the last row
+        self.window_size = num_rows if at_most is None or num_rows <= at_most else max(1, at_most - 1)
+        self.top = 0
+        self.widths = None
+
+    def row_strings(self, i):
+        row = self.get_row(i)
+        try:
+            len(row)
+        except:
+            row = [row]
+        return [str(r) for r in row]
+
+    def window(self):
+        return range(self.top, min(self.num_rows, self.top + self.window_size))
+
+    def page(self, num_pages):
+        """Move the window by a number of pages, returning whether it moved"""
+        top = self.top + num_pages * self.window_size
+        top = max(0, min(top, self.num_rows - self.window_size))
+        moved = top != self.top
+        self.top = top
+        return moved
+
+
 class TermTables(Io):
     name = "ttables"
+    # current paged listing
+    listing = None
+    # rows sampled to estimate the column widths of long listings
+    width_sample_size = 200
+    # narrowest width columns are shrunk to
+    min_column_width = 5
 
     def __init__(self, conf):
         Io.__init__(self, conf)
@@ -33,24 +71,34 @@ class TermTables(Io):
             return
         if not x_iter:
             return
+        entries = list(x_iter)
         cols = self.conf.get_view_columns()
-        entries_strings = self.gen_entries_strings(x_iter, cols)
-
-
         if do_sort:
-            scol = self.conf.get_sort_column()
-            scol_idx = cols.index(scol)
-            entries_strings_idxs = list(enumerate(entries_strings))
-            entries_strings_idxs = sorted(entries_strings_idxs, key=lambda x: x[1][scol_idx])
-            idxs, entries_strings = zip(*entries_strings_idxs)
+            idxs = self.sorted_entry_indexes(entries, entry_collection, self.conf.get_sort_column())
         else:
-            idxs = list(range(len(entries_strings)))
+            idxs = list(range(len(entries)))
         self.update_sorting_index(idxs)
 
-        self.print_enum(entries_strings, at_most=at_most, additionals=None, header=cols, preserve_col_idx=[0])
+        # only the printed rows are turned to strings
+        def get_row(i):
+            return [entries[idxs[i]].get_value(col, postproc=True) for col in cols]
+        col_widths = {}
+        if entry_collection is not None:
+            # known maximum widths, instead of sampling the rows
+            known = {"ID": entry_collection.maxlen_id, "title": entry_collection.maxlen_title}
+            col_widths = {i: known[col] for (i, col) in enumerate(cols) if col in known}
+        self.print_rows(len(entries), get_row, at_most=at_most, header=cols, preserve_col_idx=[0], col_widths=col_widths)
         if print_newline:
             self.newline()
 
+    def sorted_entry_indexes(self, entries, entry_collection, column):
+        """Get the entry indexes in sorted order, via the presorted views of the collection the entries belong to"""
+        positions = {ent.ID.lower(): i for (i, ent) in enumerate(entries)}
+        if entry_collection is None or len(positions) < len(entries) or any(ID not in entry_collection.entries for ID in positions):
+            keys = [ent.get_value(column, postproc=True) for ent in entries]
+            return sorted(range(len(entries)), key=keys.__getitem__)
+        return [positions[ID] for ID in entry_collection.sort_ids(list(positions), column)]
+
     def print_entries_contents(self, entries, header=None):
         """Function to print all available entry information in multiple rows"""
         if self.only_debug and not self.do_debug:
@@ -169,30 +217,90 @@ class TermTables(Io):
         if self.only_debug and not self.do_debug:
             return
         x_iter = utils.listify(x_iter)
-        # check which items will be printed
-        if at_most is not None and len(x_iter) > at_most:
-            idxs_print = list(range(at_most - 1)) + [len(x_iter) - 1]
-            dots = ["..."] * (len(x_iter[0]) + 1) # +1 for the enumeration
-        else:
-            idxs_print = list(range(len(x_iter)))
-            dots = None
-
-        table_data = []
-        for i, row in enumerate(x_iter):
-            if i in idxs_print:
-                try:
-                    len(row)
-                except:
-                    row = [row]
-                row = [str(r) for r in row]
-                table_data.append([str(i+1)] + row)
-        if dots:
-            table_data.insert(len(table_data)-1, dots)
-
-        if header:
-            table_data = [["idx"] +  header] + table_data
-        preserve_col_idx = [0] + [p+1 for p in preserve_col_idx]
-        table = self.get_table(table_data, preserve_col_idx=preserve_col_idx)
+        self.print_rows(len(x_iter), x_iter.__getitem__, at_most=at_most, header=header, preserve_col_idx=preserve_col_idx)
+
+    def print_rows(self, num_rows, get_row, at_most=None, header=None, preserve_col_idx=None, col_widths=None):
+        """Print rows, with a numeric column per line, getting only the printed ones by their index
+
+        Listings longer than at_most are shown a window at a time, paged with up / down.
+        col_widths maps column indexes to known maximum content widths, other widths are estimated from sampled rows.
+        """
+        if preserve_col_idx is None:
+            preserve_col_idx = []
+        self.listing = Listing(num_rows, get_row, at_most, header, [0] + [p+1 for p in preserve_col_idx])
+        widths = self.sample_column_widths(self.listing, col_widths or {})
+        self.listing.widths = self.fit_column_widths(widths, self.listing.preserve_col_idx)
+        self.print_listing()
+
+    def sample_column_widths(self, listing, col_widths):
+        """Estimate the content widths of the listing columns, from the known widths, the first window and evenly spaced rows"""
+        sample = list(listing.window())
+        if listing.num_rows > len(sample):
+            step = max(1, listing.num_rows // self.width_sample_size)
+            sample.extend(range(len(sample), listing.num_rows, step))
+        widths = None
+        for i in sample:
+            row_widths = [len(x) for x in listing.row_strings(i)]
+            widths = row_widths if widths is None else [max(w, rw) for (w, rw) in zip(widths, row_widths)]
+        if widths is None:
+            return None
+        # the enumeration column
+        widths = [len(str(listing.num_rows))] + widths
+        for col, width in col_widths.items():
+            widths[col + 1] = max(width, widths[col + 1])
+        if listing.header:
+            widths = [max(w, len(h)) for (w, h) in zip(widths, ["idx"] + listing.header)]
+        return widths
+
+    def fit_column_widths(self, widths, preserve_col_idx):
+        """Shrink the widths of the non-preserved columns, last ones first, to fit the table to the terminal"""
+        if widths is None:
+            return None
+        widths = list(widths)
+        # borders and padding take 3 characters per column, plus the closing border
+        overflow = sum(widths) + 3 * len(widths) + 1 - terminal_size()[0]
+        for col in reversed(range(len(widths))):
+            if overflow <= 0:
+                break
+            if col in preserve_col_idx:
+                continue
+            cut = min(overflow, max(0, widths[col] - self.min_column_width))
+            widths[col] -= cut
+            overflow -= cut
+        return widths
+
+    def print_listing(self):
+        """Print the current window of the listing"""
+        listing = self.listing
+        window = listing.window()
+        table_data = [[str(i+1)] + listing.row_strings(i) for i in window]
+        num_cols = len(listing.widths) if listing.widths else 1
+        if window.start > 0:
+            table_data.insert(0, ["..."] * num_cols)
+        if window.stop < listing.num_rows:
+            if window.stop < listing.num_rows - 1:
+                table_data.append(["..."] * num_cols)
+            table_data.append([str(listing.num_rows)] + listing.row_strings(listing.num_rows - 1))
+        if listing.widths:
+            table_data = [[self.prune_string(cell, width) for (cell, width) in zip(row, listing.widths)] for row in table_data]
+
+        if listing.header:
+            table_data = [["idx"] +  listing.header] + table_data
+        # cells are already pruned to the fitted widths, unless these were misestimated
+        table = self.get_table(table_data, preserve_col_idx=listing.preserve_col_idx)
 
         self.newline()
         self.print(table)
+
+    def page_listing(self, num_pages):
+        if self.listing is None or not self.listing.page(num_pages):
+            return
+        window = self.listing.window()
+        self.log("Showing rows {}-{} of {}".format(window.start + 1, window.stop, self.listing.num_rows))
+        self.print_listing()
+
+    def up(self):
+        self.page_listing(-1)
+
+    def down(self):
+        self.page_listing(1)
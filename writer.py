@@ -1,5 +1,6 @@
+import os
 from os.path import join
-from shutil import copyfile
+from shutil import copyfile, copymode
 
 import bibtexparser
 
@@ -82,7 +83,9 @@ class Writer:
         return entry_collection
 
     def write(self, entry_collection):
-        self.visual.log("Writing {} items to {}".format(len(entry_collection.bibtex_db.entries), self.bib_path))
+        if self.conf.get_write_mode() == "incremental" and self.write_incremental(entry_collection):
+            return
+        self.visual.log("Writing {} items to {}".format(len(entry_collection.entries), self.bib_path))
         # first backup to a temporary file
         tmp_path = join(self.conf.get_tmp_dir(), "library.backup.bib")
         copyfile(self.bib_path, tmp_path)
@@ -92,6 +95,92 @@ class Writer:
         except Exception as ex:
             self.visual.error(f"Failed to update library file [{ex}]. Restoring previous version.")
             copyfile(tmp_path, self.bib_path)
+            return
+        entry_collection.mark_written(self.bib_path)
+
+    def write_incremental(self, entry_collection):
+        """Write only the changed records of the collection to the library file
+
+        Returns False if the library changed since the collection was read, in which case a full write is needed.
+        """
+        if not entry_collection.source_unchanged(self.bib_path):
+            self.visual.log("Library file changed since read, falling back to a full write.")
+            return False
+        offsets = entry_collection.get_source_offsets()
+        changed = entry_collection.get_changed_ids()
+        removed = [ID for ID in offsets if ID not in entry_collection.entries]
+        appended = [ID for ID in entry_collection.id_list if ID not in offsets]
+        rewritten = [ID for ID in changed if ID in offsets]
+        try:
+            if removed or rewritten:
+                self.visual.log("Patching {} changed, {} removed and {} new records in {}".format(
+                    len(rewritten), len(removed), len(appended), self.bib_path))
+                offsets = self.patch_records(entry_collection, offsets, changed, appended)
+            elif appended:
+                self.visual.log("Appending {} new records to {}".format(len(appended), self.bib_path))
+                offsets = self.append_records(entry_collection, offsets, appended)
+        except Exception as ex:
+            self.visual.error(f"Failed to update library file [{ex}]. Keeping previous version.")
+            return True
+        entry_collection.mark_written(self.bib_path, offsets)
+        return True
+
+    @staticmethod
+    def write_record(f, data, offsets, ID):
+        """Write a record to the output file, registering its offsets"""
+        start = f.tell()
+        f.write(data)
+        offsets[ID] = (start, f.tell())
+
+    def append_records(self, entry_collection, offsets, appended):
+        """Append new records at the end of the library file, truncating it back on failure"""
+        offsets = dict(offsets)
+        with open(self.bib_path, "r+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            try:
+                for ID in appended:
+                    f.write(b"\n")
+                    self.write_record(f, self.record_bytes(entry_collection.entries[ID]), offsets, ID)
+                f.flush()
+                os.fsync(f.fileno())
+            except Exception:
+                f.truncate(size)
+                raise
+        return offsets
+
+    def patch_records(self, entry_collection, offsets, changed, appended):
+        """Rewrite the library to a temporary file, copying unchanged records as-is, then swap it in"""
+        new_offsets = {}
+        tmp_path = self.bib_path + ".tmp"
+        try:
+            with open(self.bib_path, "rb") as src, open(tmp_path, "wb") as out:
+                position = 0
+                for ID, (start, end) in sorted(offsets.items(), key=lambda x: x[1][0]):
+                    # text between records, e.g. comments and macros
+                    out.write(src.read(start - position))
+                    record = src.read(end - start)
+                    position = end
+                    if ID not in entry_collection.entries:
+                        continue
+                    if ID in changed:
+                        record = self.record_bytes(entry_collection.entries[ID])
+                    self.write_record(out, record, new_offsets, ID)
+                out.write(src.read())
+                for ID in appended:
+                    out.write(b"\n")
+                    self.write_record(out, self.record_bytes(entry_collection.entries[ID]), new_offsets, ID)
+                out.flush()
+                os.fsync(out.fileno())
+            copymode(self.bib_path, tmp_path)
+            os.replace(tmp_path, self.bib_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return new_offsets
+
+    @staticmethod
+    def record_bytes(entry):
+        return Writer.entries_to_bibtex_string([entry]).encode("utf-8")
 
     def write_confirm(self, entry_collection):
         what = self.visual.yes_no("Proceed to write?")